@@ -0,0 +1,317 @@
+"""
+SQLite 읽기 전용 커넥션 풀
+-------------------------
+API 워커 프로세스마다 하나씩 생성되어 `data/gst_patents.db`에 대한
+읽기 전용(`mode=ro`, `query_only`) 커넥션을 재사용한다.
+
+임포트 스크립트가 DB 파일을 삭제 후 재생성하면 파일 identity(inode)가 바뀌므로,
+체크아웃 시 이를 감지해 기존 커넥션을 폐기하고 새 파일로 다시 연결한다.
+
+`QueryLane`은 풀 위에 올라가는 전용 스레드 실행기로, 대기열 길이 상한(초과 시 즉시 거절)과
+요청별 타임아웃(초과 시 `Connection.interrupt()`로 쿼리 중단)을 제공한다.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+POOL_SIZE = int(os.getenv("SQLITE_POOL_SIZE", "8"))
+POOL_TIMEOUT = float(os.getenv("SQLITE_POOL_TIMEOUT", "5"))
+MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", str(32 * 1024)))
+
+# 레인별 워커 수의 합은 POOL_SIZE 이하로 유지한다.
+LOOKUP_WORKERS = int(os.getenv("API_LOOKUP_WORKERS", "4"))
+LOOKUP_QUEUE = int(os.getenv("API_LOOKUP_QUEUE", "64"))
+LOOKUP_TIMEOUT = float(os.getenv("API_LOOKUP_TIMEOUT", "3"))
+SEARCH_WORKERS = int(os.getenv("API_SEARCH_WORKERS", "2"))
+SEARCH_QUEUE = int(os.getenv("API_SEARCH_QUEUE", "16"))
+SEARCH_TIMEOUT = float(os.getenv("API_SEARCH_TIMEOUT", "10"))
+
+
+class PoolTimeout(RuntimeError):
+    """풀에서 제한 시간 안에 커넥션을 얻지 못했을 때 발생."""
+
+
+class LaneOverloaded(RuntimeError):
+    """실행 대기열이 가득 차 요청을 받을 수 없을 때 발생."""
+
+
+class QueryTimeout(RuntimeError):
+    """쿼리가 요청 타임아웃 안에 끝나지 않았을 때 발생."""
+
+
+def _file_identity(path: Path) -> Optional[Tuple[int, int]]:
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return None
+    return st.st_dev, st.st_ino
+
+
+class ConnectionPool:
+    """고정 크기의 읽기 전용 SQLite 커넥션 풀."""
+
+    def __init__(
+        self,
+        db_path: Path,
+        size: int = POOL_SIZE,
+        timeout: float = POOL_TIMEOUT,
+        mmap_size: int = MMAP_SIZE,
+        cache_size_kb: int = CACHE_SIZE_KB,
+    ):
+        self.db_path = Path(db_path)
+        self.size = max(1, size)
+        self.timeout = timeout
+        self.mmap_size = mmap_size
+        self.cache_size_kb = cache_size_kb
+        self.journal_mode: Optional[str] = None
+
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._identity: Optional[Tuple[int, int]] = None
+        self._generation = 0
+        self._generations: Dict[int, int] = {}
+        self._closed = True
+
+        self._checkouts = 0
+        self._waits = 0
+        self._wait_seconds = 0.0
+        self._timeouts = 0
+        self._in_use = 0
+        self._opened = 0
+        self._recycled = 0
+
+    def open(self) -> None:
+        """풀을 활성화하고 커넥션 하나를 미리 열어 스키마를 로드해 둔다."""
+        with self._lock:
+            self._closed = False
+            self._identity = _file_identity(self.db_path)
+        if self._identity is not None:
+            self._idle.put(self._connect())
+
+    def close(self) -> None:
+        """유휴 커넥션을 모두 닫는다. 사용 중인 커넥션은 반환 시점에 닫힌다."""
+        with self._lock:
+            self._closed = True
+            self._generation += 1
+        self._drain()
+
+    def _connect(self) -> sqlite3.Connection:
+        uri = f"file:{self.db_path}?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA query_only = ON")
+        conn.execute(f"PRAGMA mmap_size = {int(self.mmap_size)}")
+        conn.execute(f"PRAGMA cache_size = -{int(self.cache_size_kb)}")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        # WAL 모드 DB라면 읽기 전용 커넥션도 -shm 을 통해 최신 스냅샷을 본다.
+        # journal_mode는 읽기 전용 커넥션에서 바꿀 수 없으므로 확인만 한다.
+        self.journal_mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+        with self._lock:
+            self._opened += 1
+            self._generations[id(conn)] = self._generation
+        return conn
+
+    def _discard(self, conn: sqlite3.Connection) -> None:
+        with self._lock:
+            self._generations.pop(id(conn), None)
+        conn.close()
+
+    def _drain(self) -> None:
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self._discard(conn)
+
+    def _check_file_changed(self) -> None:
+        identity = _file_identity(self.db_path)
+        if identity == self._identity:
+            return
+        with self._lock:
+            if identity == self._identity:
+                return
+            self._identity = identity
+            self._generation += 1
+            self._recycled += 1
+        self._drain()
+
+    def _acquire(self) -> sqlite3.Connection:
+        if self._closed:
+            raise RuntimeError("커넥션 풀이 열려 있지 않습니다.")
+        started = time.perf_counter()
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._waits += 1
+            if not self._slots.acquire(timeout=self.timeout):
+                with self._lock:
+                    self._timeouts += 1
+                raise PoolTimeout(f"{self.timeout:.1f}초 안에 SQLite 커넥션을 얻지 못했습니다.")
+            with self._lock:
+                self._wait_seconds += time.perf_counter() - started
+
+        try:
+            self._check_file_changed()
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = self._connect()
+        except Exception:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self._checkouts += 1
+            self._in_use += 1
+        return conn
+
+    def _release(self, conn: sqlite3.Connection) -> None:
+        with self._lock:
+            self._in_use -= 1
+            stale = self._closed or self._generations.get(id(conn)) != self._generation
+        if stale:
+            self._discard(conn)
+        else:
+            self._idle.put(conn)
+        self._slots.release()
+
+    def data_version(self) -> Optional[Tuple[int, ...]]:
+        """DB 파일 변경을 감지하기 위한 버전 토큰.
+
+        `PRAGMA data_version`은 커넥션마다 독립적인 카운터라 풀 전체에서 비교할 수 없으므로,
+        본 파일과 WAL 파일의 identity/mtime/size 조합을 사용한다.
+        """
+        try:
+            st = self.db_path.stat()
+        except FileNotFoundError:
+            return None
+        version: Tuple[int, ...] = (st.st_dev, st.st_ino, st.st_mtime_ns, st.st_size)
+        wal_path = self.db_path.with_name(self.db_path.name + "-wal")
+        try:
+            wal = wal_path.stat()
+        except FileNotFoundError:
+            return version
+        return version + (wal.st_mtime_ns, wal.st_size)
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        conn = self._acquire()
+        try:
+            yield conn
+        finally:
+            self._release(conn)
+
+    def metrics(self) -> Dict:
+        with self._lock:
+            return {
+                "size": self.size,
+                "in_use": self._in_use,
+                "idle": self._idle.qsize(),
+                "checkouts": self._checkouts,
+                "waits": self._waits,
+                "wait_seconds": round(self._wait_seconds, 6),
+                "timeouts": self._timeouts,
+                "opened": self._opened,
+                "recycled": self._recycled,
+                "journal_mode": self.journal_mode,
+            }
+
+
+class QueryLane:
+    """커넥션 풀을 공유하는 고정 크기 스레드 실행기.
+
+    실행 중 + 대기 중인 작업이 `workers + max_queue`를 넘으면 새 작업을 대기시키지 않고
+    `LaneOverloaded`를 던진다. 레인을 나누면 느린 FTS 쿼리가 몰려도 단건 조회 레인은 영향받지 않는다.
+    """
+
+    def __init__(self, pool: ConnectionPool, name: str, workers: int, max_queue: int, timeout: float):
+        self.pool = pool
+        self.name = name
+        self.workers = max(1, workers)
+        self.max_queue = max(0, max_queue)
+        self.timeout = timeout
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._completed = 0
+        self._rejected = 0
+        self._timeouts = 0
+
+    def start(self) -> None:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=f"sqlite-{self.name}")
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _done(self, _future) -> None:
+        with self._lock:
+            self._pending -= 1
+            self._completed += 1
+
+    async def run(self, fn: Callable[..., Any], *args) -> Any:
+        """`fn(conn, *args)`를 레인의 워커 스레드에서 풀 커넥션과 함께 실행한다."""
+        if self._executor is None:
+            raise RuntimeError(f"'{self.name}' 레인이 시작되지 않았습니다.")
+        with self._lock:
+            if self._pending >= self.workers + self.max_queue:
+                self._rejected += 1
+                raise LaneOverloaded(f"'{self.name}' 레인의 대기열이 가득 찼습니다.")
+            self._pending += 1
+
+        state: Dict[str, Any] = {"conn": None, "cancelled": False}
+        state_lock = threading.Lock()
+
+        def job():
+            with self.pool.connection() as conn:
+                with state_lock:
+                    if state["cancelled"]:
+                        raise QueryTimeout("대기 중 타임아웃")
+                    state["conn"] = conn
+                try:
+                    return fn(conn, *args)
+                finally:
+                    with state_lock:
+                        state["conn"] = None
+
+        # 요청 컨텍스트(계측용 ContextVar 등)를 워커 스레드로 전달한다.
+        future = self._executor.submit(contextvars.copy_context().run, job)
+        future.add_done_callback(self._done)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), self.timeout)
+        except asyncio.TimeoutError:
+            with state_lock:
+                state["cancelled"] = True
+                if state["conn"] is not None:
+                    state["conn"].interrupt()
+            future.cancel()
+            with self._lock:
+                self._timeouts += 1
+            raise QueryTimeout(f"'{self.name}' 쿼리가 {self.timeout:.1f}초 안에 끝나지 않았습니다.") from None
+
+    def metrics(self) -> Dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "timeout": self.timeout,
+                "pending": self._pending,
+                "completed": self._completed,
+                "rejected": self._rejected,
+                "timeouts": self._timeouts,
+            }
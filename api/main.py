@@ -1,123 +1,645 @@
+import base64
+import binascii
+import hashlib
+import html
+import json
+import os
+import logging
+import sqlite3
+import threading
+import time
+from contextlib import asynccontextmanager
+from email.utils import formatdate, parsedate_to_datetime
 from pathlib import Path
-from typing import List, Optional
+from typing import Dict, List, Optional
 
-import sqlite3
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import FastAPI, HTTPException, Query, Request, Response
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 from pydantic import BaseModel
+from starlette.datastructures import MutableHeaders
+from starlette.routing import Match
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import orjson
+except ImportError:  # orjson이 없으면 표준 json으로 직렬화한다.
+    orjson = None
+
+try:
+    from brotli_asgi import BrotliMiddleware
+except ImportError:  # brotli-asgi가 없으면 gzip만 사용한다.
+    BrotliMiddleware = None
+
+from api.db import (
+    LOOKUP_QUEUE,
+    LOOKUP_TIMEOUT,
+    LOOKUP_WORKERS,
+    SEARCH_QUEUE,
+    SEARCH_TIMEOUT,
+    SEARCH_WORKERS,
+    ConnectionPool,
+    LaneOverloaded,
+    PoolTimeout,
+    QueryLane,
+    QueryTimeout,
+)
+from api.metrics import (
+    HISTOGRAMS,
+    REQUEST_LATENCY,
+    ROWS_RETURNED,
+    SERIALIZE_TIME,
+    SQLITE_TIME,
+    add_request_stat,
+    new_request_stats,
+    render_samples,
+    request_stats,
+)
+
+logger = logging.getLogger("gst_patents.api")
 
 ROOT = Path(__file__).resolve().parent.parent
-DB_PATH = ROOT / "data" / "gst_patents.db"
+DB_PATH = Path(os.getenv("GST_PATENTS_DB", ROOT / "data" / "gst_patents.db"))
+CACHE_CONTROL = os.getenv("API_CACHE_CONTROL", "public, max-age=60, stale-while-revalidate=600")
+CACHEABLE_PREFIXES = ("/patents", "/stats")
+COMPRESS_MIN_SIZE = int(os.getenv("API_COMPRESS_MIN_SIZE", "1024"))
+EXPLAIN_SLOW_QUERIES = os.getenv("API_EXPLAIN_SLOW_QUERIES", "false").lower() in {"1", "true", "yes"}
+SLOW_QUERY_SECONDS = float(os.getenv("API_SLOW_QUERY_MS", "50")) / 1000
+GZIP_LEVEL = int(os.getenv("API_GZIP_LEVEL", "5"))
+BROTLI_QUALITY = int(os.getenv("API_BROTLI_QUALITY", "4"))
+
+pool = ConnectionPool(DB_PATH)
+# 단건/목록 조회와 FTS 검색을 서로 다른 레인에서 실행해, 느린 검색이 조회를 굶기지 않게 한다.
+lookup_lane = QueryLane(pool, "lookup", LOOKUP_WORKERS, LOOKUP_QUEUE, LOOKUP_TIMEOUT)
+search_lane = QueryLane(pool, "search", SEARCH_WORKERS, SEARCH_QUEUE, SEARCH_TIMEOUT)
+LANES = (lookup_lane, search_lane)
+
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    pool.open()
+    for lane in LANES:
+        lane.start()
+    try:
+        yield
+    finally:
+        for lane in LANES:
+            lane.shutdown()
+        pool.close()
+
+
+class FastJSONResponse(JSONResponse):
+    """orjson이 설치되어 있으면 orjson으로, 아니면 ensure_ascii=False인 json으로 직렬화한다."""
+
+    def render(self, content) -> bytes:
+        started = time.perf_counter()
+        if orjson is not None:
+            body = orjson.dumps(content)
+        else:
+            body = json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        add_request_stat("serialize_seconds", time.perf_counter() - started)
+        return body
+
+
+app = FastAPI(title="GST Patents API", lifespan=lifespan, default_response_class=FastJSONResponse)
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or etag.removeprefix("W/") in candidates
+
+
+def _not_modified_since(if_modified_since: str, last_modified: float) -> bool:
+    try:
+        since = parsedate_to_datetime(if_modified_since).timestamp()
+    except (TypeError, ValueError):
+        return False
+    return int(last_modified) <= since
+
+
+class HTTPCacheMiddleware:
+    """DB 파일 버전 + 요청 경로/파라미터로 ETag를 만들고, 조건부 요청에는 304로 응답한다.
+
+    코퍼스는 임포트 스크립트가 DB 파일을 다시 만들 때만 바뀌므로, 같은 버전 안에서는
+    같은 URL의 응답이 항상 같다. 일치하면 핸들러와 SQLite를 전혀 거치지 않는다.
+
+    BaseHTTPMiddleware(@app.middleware)는 응답 본문을 스트리밍으로 다시 보내 압축 미들웨어의
+    minimum_size 검사를 무력화하므로, 본문을 그대로 통과시키는 순수 ASGI 미들웨어로 구현한다.
+    """
 
-app = FastAPI(title="GST Patents API")
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if (
+            scope["type"] != "http"
+            or scope["method"] not in ("GET", "HEAD")
+            or not scope["path"].startswith(CACHEABLE_PREFIXES)
+        ):
+            await self.app(scope, receive, send)
+            return
+        version = pool.data_version()
+        if version is None:
+            await self.app(scope, receive, send)
+            return
+
+        request = Request(scope)
+        query = "&".join(sorted(request.url.query.split("&"))) if request.url.query else ""
+        digest = hashlib.sha1(f"{version}|{request.url.path}|{query}".encode("utf-8")).hexdigest()
+        etag = f'W/"{digest[:32]}"'
+        last_modified = max(version[2], version[4] if len(version) > 4 else 0) / 1e9
+        headers = {
+            "ETag": etag,
+            "Last-Modified": formatdate(last_modified, usegmt=True),
+            "Cache-Control": CACHE_CONTROL,
+        }
+
+        if_none_match = request.headers.get("if-none-match")
+        if_modified_since = request.headers.get("if-modified-since")
+        if (if_none_match and _etag_matches(if_none_match, etag)) or (
+            not if_none_match and if_modified_since and _not_modified_since(if_modified_since, last_modified)
+        ):
+            await Response(status_code=304, headers=headers)(scope, receive, send)
+            return
+
+        async def send_with_cache_headers(message: Message) -> None:
+            if message["type"] == "http.response.start" and message["status"] == 200:
+                MutableHeaders(scope=message).update(headers)
+            await send(message)
+
+        await self.app(scope, receive, send_with_cache_headers)
+
+
+def route_template(scope: Scope) -> str:
+    """요청에 맞는 라우트 경로 템플릿(예: /patents/{patent_id}).
+
+    HTTPCacheMiddleware가 304로 먼저 응답하면 라우팅을 거치지 않아 scope에 route가 없으므로 직접 매칭한다.
+    어떤 라우트와도 맞지 않으면 레이블 수가 늘지 않도록 "unmatched"로 묶는다.
+    """
+    route = scope.get("route")
+    if route is None:
+        for candidate in app.router.routes:
+            match, _ = candidate.matches(scope)
+            if match == Match.FULL:
+                route = candidate
+                break
+    return getattr(route, "path", None) or "unmatched"
+
+
+class RequestMetricsMiddleware:
+    """라우트별 지연 시간과 SQLite/직렬화 시간, 반환 행 수를 기록한다. (HTTPCacheMiddleware보다 바깥에서 실행)"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        stats = new_request_stats()
+        token = request_stats.set(stats)
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            request_stats.reset(token)
+            route_path = route_template(scope)
+            if route_path != "/metrics":
+                REQUEST_LATENCY.observe(
+                    time.perf_counter() - started, route=route_path, method=scope["method"], status=str(status)
+                )
+                if stats["queries"]:
+                    SQLITE_TIME.observe(stats["sqlite_seconds"], route=route_path)
+                    ROWS_RETURNED.observe(stats["rows"], route=route_path)
+                if stats["serialize_seconds"]:
+                    SERIALIZE_TIME.observe(stats["serialize_seconds"], route=route_path)
 
 
 class Patent(BaseModel):
     id: str
-    patent_number: Optional[str]
-    title: Optional[str]
-    abstract: Optional[str]
-    category: Optional[str]
-    technology_field: Optional[str]
-    registration_date: Optional[str]
-    status: Optional[str]
-    assignee: Optional[str]
-    priority_score: Optional[int]
+    patent_number: Optional[str] = None
+    title: Optional[str] = None
+    abstract: Optional[str] = None
+    category: Optional[str] = None
+    technology_field: Optional[str] = None
+    registration_date: Optional[str] = None
+    status: Optional[str] = None
+    assignee: Optional[str] = None
+    priority_score: Optional[int] = None
+
+
+class SearchHit(Patent):
+    score: Optional[float] = None
+    # snippet/title_highlight는 HTML: 특허 텍스트는 이스케이프되어 있고 일치 구간만 <mark>로 감싼다.
+    snippet: Optional[str] = None
+    title_highlight: Optional[str] = None
 
 
 class PatentDetail(Patent):
-    application_date: Optional[str]
-    publication_date: Optional[str]
-    main_claims: Optional[str]
-    full_text: Optional[str]
-    page_count: Optional[int]
-    ipc_classification: Optional[str]
-    legal_status: Optional[str]
-    image_count: Optional[int]
+    application_date: Optional[str] = None
+    publication_date: Optional[str] = None
+    main_claims: Optional[str] = None
+    full_text: Optional[str] = None
+    page_count: Optional[int] = None
+    ipc_classification: Optional[str] = None
+    legal_status: Optional[str] = None
+    image_count: Optional[int] = None
     inventors: List[str] = []
     keywords: List[str] = []
 
 
-def get_conn():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+MAX_BATCH_IDS = 200
+
+# bm25() 컬럼 가중치: patent_id(UNINDEXED), title, abstract, technology_field, full_text
+BM25_WEIGHTS = (0.0, 10.0, 5.0, 3.0, 1.0)
+BM25_EXPR = "bm25(patent_search, {})".format(", ".join(str(w) for w in BM25_WEIGHTS))
+HIGHLIGHT_OPEN = "<mark>"
+HIGHLIGHT_CLOSE = "</mark>"
+# FTS5에는 사용자 텍스트에 나오지 않는 사설 영역 문자를 표시로 넘기고, 본문을 HTML 이스케이프한 뒤 <mark>로 바꾼다.
+HIGHLIGHT_OPEN_MARKER = "\ue000"
+HIGHLIGHT_CLOSE_MARKER = "\ue001"
+HIGHLIGHT_FIELDS = ("snippet", "title_highlight")
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+FACET_QUERY = (
+    "SELECT facet, NULLIF(value, '') AS value, count FROM patent_facets "
+    "WHERE count > 0 ORDER BY facet, count DESC, value"
+)
+# patent_facets 테이블이 없는 예전 DB 파일용 (스키마 재적용 전까지 사용)
+FACET_FALLBACK_QUERY = " UNION ALL ".join(
+    f"SELECT '{facet}' AS facet, {expr} AS value, COUNT(*) AS count FROM patents GROUP BY 2"
+    for facet, expr in (
+        ("category", "NULLIF(category, '')"),
+        ("status", "NULLIF(status, '')"),
+        ("year", "NULLIF(substr(registration_date, 1, 4), '')"),
+        ("technology_field", "NULLIF(technology_field, '')"),
+    )
+) + " ORDER BY facet, count DESC, value"
+
+# patent_facets는 NULL과 ''를 같은 버킷으로 모으므로, /stats의 카테고리 수(기존: NULL이 아닌 모든 값)를
+# 맞추기 위해 빈 문자열 카테고리 존재 여부는 인덱스로 따로 확인한다.
+EMPTY_CATEGORY_QUERY = "SELECT EXISTS(SELECT 1 FROM patents WHERE category = '') AS present"
+
+_facet_cache: Dict = {"version": None, "facets": None, "empty_category": False}
+_facet_cache_lock = threading.Lock()
+
+# 목록 응답은 이 컬럼만 읽는다. full_text/main_claims 같은 대형 컬럼은 상세 응답에서만 읽는다.
+LIST_COLUMNS = (
+    "id", "patent_number", "title", "abstract", "category", "technology_field",
+    "registration_date", "status", "assignee", "priority_score",
+)
+SEARCH_FIELDS = ("score", "snippet", "title_highlight")
+DETAIL_COLUMNS = LIST_COLUMNS + (
+    "application_date", "publication_date", "main_claims", "full_text", "page_count",
+    "ipc_classification", "legal_status", "image_count",
+)
+DETAIL_SUBQUERIES = {
+    "inventors": "(SELECT json_group_array(name) FROM patent_inventors WHERE patent_id = p.id)",
+    "keywords": "(SELECT json_group_array(keyword) FROM patent_keywords WHERE patent_id = p.id)",
+}
+
 
+def explain_query(conn: sqlite3.Connection, query: str, params, elapsed: float) -> None:
+    plan = conn.execute("EXPLAIN QUERY PLAN " + query, params).fetchall()
+    depth: Dict[int, int] = {0: 0}
+    for row in plan:
+        depth[row[0]] = depth.get(row[1], 0) + 1
+    lines = "\n".join(f"{'  ' * depth[row[0]]}{row[3]}" for row in plan)
+    full_scan = any(row[3].startswith("SCAN ") and "VIRTUAL TABLE" not in row[3] for row in plan)
+    logger.warning(
+        "느린 쿼리 %.1fms%s\n%s\n%s",
+        elapsed * 1000,
+        " (풀 스캔 포함)" if full_scan else "",
+        query,
+        lines,
+    )
 
-@app.get("/patents", response_model=List[Patent])
-def list_patents(
+
+def fetch_all(conn: sqlite3.Connection, query: str, params=()) -> List[sqlite3.Row]:
+    started = time.perf_counter()
+    rows = conn.execute(query, params).fetchall()
+    elapsed = time.perf_counter() - started
+    add_request_stat("sqlite_seconds", elapsed)
+    add_request_stat("rows", len(rows))
+    add_request_stat("queries", 1)
+    if EXPLAIN_SLOW_QUERIES and elapsed >= SLOW_QUERY_SECONDS:
+        explain_query(conn, query, params, elapsed)
+    return rows
+
+
+def fetch_one(conn: sqlite3.Connection, query: str, params=()) -> Optional[sqlite3.Row]:
+    rows = fetch_all(conn, query, params)
+    return rows[0] if rows else None
+
+
+async def run_db(lane: QueryLane, fn, *args):
+    """DB 작업을 레인에서 실행하고, 과부하/타임아웃을 HTTP 오류로 변환한다."""
+    try:
+        return await lane.run(fn, *args)
+    except (LaneOverloaded, PoolTimeout) as exc:
+        raise HTTPException(status_code=503, detail=str(exc), headers={"Retry-After": "1"}) from exc
+    except QueryTimeout as exc:
+        raise HTTPException(status_code=504, detail=str(exc)) from exc
+
+
+def parse_fields(fields: Optional[str], allowed) -> List[str]:
+    """`fields=a,b,c` 파라미터를 검증한다. 지정하지 않으면 허용된 전체 필드를 반환한다."""
+    if not fields:
+        return list(allowed)
+    requested = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = [name for name in requested if name not in allowed]
+    if unknown:
+        raise HTTPException(
+            status_code=422,
+            detail=f"Unknown fields: {', '.join(unknown)} (allowed: {', '.join(allowed)})",
+        )
+    return list(dict.fromkeys(["id", *requested]))
+
+
+def render_highlight(text: Optional[str]) -> Optional[str]:
+    """FTS5 snippet()/highlight() 결과를 안전한 HTML로 바꾼다. 특허 본문은 이스케이프하고 표시만 <mark>로 남긴다."""
+    if text is None:
+        return None
+    return html.escape(text, quote=False).replace(HIGHLIGHT_OPEN_MARKER, HIGHLIGHT_OPEN).replace(HIGHLIGHT_CLOSE_MARKER, HIGHLIGHT_CLOSE)
+
+
+def encode_cursor(kind: str, *key) -> str:
+    payload = json.dumps([kind, *key], ensure_ascii=False, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, kind: str) -> List:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (binascii.Error, UnicodeError, ValueError) as exc:
+        raise HTTPException(status_code=400, detail="Invalid cursor") from exc
+    if not isinstance(payload, list) or len(payload) != 3 or payload[0] != kind:
+        raise HTTPException(status_code=400, detail="Cursor does not match this query")
+    return payload[1:]
+
+
+def fetch_browse(conn: sqlite3.Connection, phases: List, limit: int) -> List[sqlite3.Row]:
+    """(쿼리, 파라미터) 구간을 순서대로 실행해 limit개가 찰 때까지 이어 붙인다."""
+    rows: List[sqlite3.Row] = []
+    for query, params in phases:
+        rows += fetch_all(
+            conn, query + " ORDER BY registration_date DESC, id DESC LIMIT ?", [*params, limit - len(rows)]
+        )
+        if len(rows) >= limit:
+            break
+    return rows
+
+
+@app.get("/patents", response_model=List[SearchHit], response_model_exclude_unset=True)
+async def list_patents(
     q: Optional[str] = Query(None, description="Full-text search term"),
     category: Optional[str] = None,
     status: Optional[str] = None,
-    limit: int = Query(50, le=200)
+    limit: int = Query(50, le=200),
+    cursor: Optional[str] = Query(None, description=f"Opaque cursor from the {NEXT_CURSOR_HEADER} header"),
+    min_score: Optional[float] = Query(None, ge=0, description="Drop FTS hits scoring below this"),
+    snippet_tokens: int = Query(24, ge=4, le=64, description="Tokens per FTS snippet"),
+    fields: Optional[str] = Query(None, description="Comma-separated sparse fieldset"),
 ):
-    conn = get_conn()
-    cursor = conn.cursor()
+    selected = parse_fields(fields, LIST_COLUMNS + SEARCH_FIELDS if q else LIST_COLUMNS)
+    columns = [f"p.{name}" for name in selected if name in LIST_COLUMNS]
 
     if q:
+        # bm25()는 낮을수록 관련도가 높으므로 부호를 뒤집어 score로 노출한다.
+        # score와 rowid는 커서 생성에 필요하므로 항상 조회한다.
+        columns += ["patent_search.rowid AS fts_rowid", f"-{BM25_EXPR} AS score"]
+        params: List = []
+        if "snippet" in selected:
+            columns.append("snippet(patent_search, -1, ?, ?, '…', ?) AS snippet")
+            params += [HIGHLIGHT_OPEN_MARKER, HIGHLIGHT_CLOSE_MARKER, snippet_tokens]
+        if "title_highlight" in selected:
+            columns.append("highlight(patent_search, 1, ?, ?) AS title_highlight")
+            params += [HIGHLIGHT_OPEN_MARKER, HIGHLIGHT_CLOSE_MARKER]
         query = (
-            "SELECT p.* FROM patent_search ps "
-            "JOIN patents p ON ps.patent_id = p.id "
-            "WHERE ps MATCH ?"
+            f"SELECT {', '.join(columns)} FROM patent_search "
+            "JOIN patents p ON patent_search.patent_id = p.id "
+            "WHERE patent_search MATCH ?"
         )
-        params: List = [q]
+        params.append(q)
         if category:
             query += " AND p.category = ?"
             params.append(category)
         if status:
             query += " AND p.status = ?"
             params.append(status)
-        query += " LIMIT ?"
+        if min_score is not None:
+            query += f" AND {BM25_EXPR} <= ?"
+            params.append(-min_score)
+        if cursor:
+            last_score, last_rowid = decode_cursor(cursor, "fts")
+            query += f" AND ({BM25_EXPR} > ? OR ({BM25_EXPR} = ? AND patent_search.rowid > ?))"
+            params.extend([-last_score, -last_score, last_rowid])
+        query += f" ORDER BY {BM25_EXPR}, patent_search.rowid LIMIT ?"
         params.append(limit)
-        cursor.execute(query, params)
     else:
-        query = "SELECT * FROM patents WHERE 1=1"
+        if "registration_date" not in selected:
+            columns.append("p.registration_date")
+        base = f"SELECT {', '.join(columns)} FROM patents p WHERE 1=1"
         params: List = []
         if category:
-            query += " AND category = ?"
+            base += " AND category = ?"
             params.append(category)
         if status:
-            query += " AND status = ?"
+            base += " AND status = ?"
             params.append(status)
-        query += " ORDER BY registration_date DESC LIMIT ?"
-        params.append(limit)
-        cursor.execute(query, params)
+        # registration_date가 NULL인 행은 DESC 정렬에서 맨 뒤에 온다. 행 값 비교에 `OR registration_date IS NULL`을
+        # 섞으면 인덱스 탐색 대신 스캔이 되므로, 날짜가 있는 구간과 NULL 구간을 각각 인덱스로 탐색해 이어 붙인다.
+        if not cursor:
+            phases = [(base, params)]
+        else:
+            last_date, last_id = decode_cursor(cursor, "browse")
+            if last_date is None:
+                phases = [(base + " AND registration_date IS NULL AND id < ?", [*params, last_id])]
+            else:
+                phases = [
+                    (base + " AND (registration_date, id) < (?, ?)", [*params, last_date, last_id]),
+                    (base + " AND registration_date IS NULL", params),
+                ]
+
+    try:
+        if q:
+            rows = await run_db(search_lane, fetch_all, query, params)
+        else:
+            rows = await run_db(lookup_lane, fetch_browse, phases, limit)
+    except sqlite3.OperationalError as exc:
+        if q:
+            raise HTTPException(status_code=400, detail=f"Invalid search query: {exc}") from exc
+        raise
 
-    patents = [Patent(**dict(row)) for row in cursor.fetchall()]
-    conn.close()
-    return patents
+    headers = {}
+    if len(rows) == limit:
+        last = rows[-1]
+        if q:
+            next_cursor = encode_cursor("fts", last["score"], last["fts_rowid"])
+        else:
+            next_cursor = encode_cursor("browse", last["registration_date"], last["id"])
+        headers[NEXT_CURSOR_HEADER] = next_cursor
+    # 목록은 Pydantic 모델을 거치지 않고 Row에서 바로 직렬화한다. (스키마는 response_model로 문서화)
+    items = [{name: row[name] for name in selected} for row in rows]
+    for field in HIGHLIGHT_FIELDS:
+        if field in selected:
+            for item in items:
+                item[field] = render_highlight(item[field])
+    return FastJSONResponse(items, headers=headers)
 
 
-@app.get("/patents/{patent_id}", response_model=PatentDetail)
-def get_patent(patent_id: str):
-    conn = get_conn()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM patents WHERE id = ?", (patent_id,))
-    row = cursor.fetchone()
+def build_detail_query(selected: List[str]) -> str:
+    columns = [
+        f"{DETAIL_SUBQUERIES[name]} AS {name}" if name in DETAIL_SUBQUERIES else f"p.{name}"
+        for name in selected
+    ]
+    return f"SELECT {', '.join(columns)} FROM patents p"
+
+
+def row_to_detail(row, selected: List[str]) -> Dict:
+    data = {}
+    for name in selected:
+        value = row[name]
+        if name in DETAIL_SUBQUERIES:
+            value = [item for item in json.loads(value or "[]") if item]
+        data[name] = value
+    return data
+
+
+@app.get("/patents/batch", response_model=List[PatentDetail], response_model_exclude_unset=True)
+async def get_patents_batch(
+    ids: List[str] = Query(..., description="Patent IDs (comma-separated or repeated)"),
+    fields: Optional[str] = Query(None, description="Comma-separated sparse fieldset"),
+):
+    selected = parse_fields(fields, DETAIL_COLUMNS + tuple(DETAIL_SUBQUERIES))
+    requested: List[str] = []
+    for value in ids:
+        requested.extend(part.strip() for part in value.split(",") if part.strip())
+    requested = list(dict.fromkeys(requested))
+    if len(requested) > MAX_BATCH_IDS:
+        raise HTTPException(status_code=422, detail=f"At most {MAX_BATCH_IDS} ids per request")
+    if not requested:
+        return []
+
+    rows = await run_db(
+        lookup_lane,
+        fetch_all,
+        build_detail_query(selected) + " WHERE p.id IN (SELECT value FROM json_each(?))",
+        (json.dumps(requested),),
+    )
+
+    by_id = {row["id"]: row_to_detail(row, selected) for row in rows}
+    return FastJSONResponse([by_id[patent_id] for patent_id in requested if patent_id in by_id])
+
+
+@app.get("/patents/{patent_id}", response_model=PatentDetail, response_model_exclude_unset=True)
+async def get_patent(
+    patent_id: str,
+    fields: Optional[str] = Query(None, description="Comma-separated sparse fieldset"),
+):
+    selected = parse_fields(fields, DETAIL_COLUMNS + tuple(DETAIL_SUBQUERIES))
+    row = await run_db(lookup_lane, fetch_one, build_detail_query(selected) + " WHERE p.id = ?", (patent_id,))
     if not row:
-        conn.close()
         raise HTTPException(status_code=404, detail="Patent not found")
+    return PatentDetail(**row_to_detail(row, selected))
+
 
-    detail = PatentDetail(**dict(row))
+def query_facets(conn: sqlite3.Connection):
+    try:
+        rows = fetch_all(conn, FACET_QUERY)
+    except sqlite3.OperationalError:
+        rows = fetch_all(conn, FACET_FALLBACK_QUERY)
+    return rows, bool(fetch_one(conn, EMPTY_CATEGORY_QUERY)["present"])
 
-    cursor.execute("SELECT name FROM patent_inventors WHERE patent_id = ?", (patent_id,))
-    detail.inventors = [r[0] for r in cursor.fetchall()]
 
-    cursor.execute("SELECT keyword FROM patent_keywords WHERE patent_id = ?", (patent_id,))
-    detail.keywords = [r[0] for r in cursor.fetchall()]
+async def load_facets() -> Dict:
+    """facet별 집계와 빈 문자열 카테고리 존재 여부. DB 파일이 바뀌지 않았다면 프로세스 메모리의 값을 재사용한다."""
+    version = pool.data_version()
+    with _facet_cache_lock:
+        if version is not None and _facet_cache["version"] == version:
+            return dict(_facet_cache)
 
-    conn.close()
-    return detail
+    rows, empty_category = await run_db(lookup_lane, query_facets)
+
+    facets: Dict[str, List[Dict]] = {"category": [], "status": [], "year": [], "technology_field": []}
+    for row in rows:
+        facets.setdefault(row["facet"], []).append({"value": row["value"], "count": row["count"]})
+
+    with _facet_cache_lock:
+        _facet_cache.update(version=version, facets=facets, empty_category=empty_category)
+        return dict(_facet_cache)
 
 
 @app.get("/stats")
-def stats():
-    conn = get_conn()
-    cursor = conn.cursor()
-    cursor.execute("SELECT COUNT(*) as count FROM patents")
-    total = cursor.fetchone()["count"]
-    cursor.execute("SELECT COUNT(*) as count FROM patents WHERE status = 'active'")
-    active = cursor.fetchone()["count"]
-    cursor.execute("SELECT COUNT(DISTINCT category) as count FROM patents WHERE category IS NOT NULL")
-    categories = cursor.fetchone()["count"]
-    conn.close()
+async def stats():
+    cached = await load_facets()
+    facets = cached["facets"]
+    total = sum(item["count"] for item in facets["status"])
+    active = sum(item["count"] for item in facets["status"] if item["value"] == "active")
+    # NULL이 아닌 서로 다른 카테고리 수 ('' 포함)
+    categories = sum(1 for item in facets["category"] if item["value"] is not None) + int(cached["empty_category"])
     return {"total": total, "active": active, "categories": categories}
+
+
+@app.get("/stats/facets")
+async def stats_facets():
+    """카테고리/상태/등록연도/기술분야별 특허 수."""
+    return (await load_facets())["facets"]
+
+
+@app.get("/metrics/pool")
+def pool_metrics():
+    """워커별 SQLite 커넥션 풀/실행 레인 사용 현황 (풀 크기 산정용)."""
+    return {**pool.metrics(), "lanes": {lane.name: lane.metrics() for lane in LANES}}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    """Prometheus 텍스트 포맷 메트릭 (요청 히스토그램 + 풀/레인 상태)."""
+    lines: List[str] = []
+    for histogram in HISTOGRAMS:
+        lines += histogram.render()
+
+    pool_stats = pool.metrics()
+    for name, kind, help_text, key in (
+        ("gst_api_pool_in_use", "gauge", "Pooled connections checked out.", "in_use"),
+        ("gst_api_pool_checkouts_total", "counter", "Pool checkouts.", "checkouts"),
+        ("gst_api_pool_waits_total", "counter", "Checkouts that had to wait.", "waits"),
+    ):
+        lines += render_samples(name, kind, help_text, [({}, pool_stats[key])])
+    lane_stats = {lane.name: lane.metrics() for lane in LANES}
+    lines += render_samples(
+        "gst_api_lane_pending", "gauge", "Queued plus running jobs per lane.",
+        [({"lane": name}, item["pending"]) for name, item in lane_stats.items()],
+    )
+    lines += render_samples(
+        "gst_api_lane_rejected_total", "counter", "Jobs shed with 503 per lane.",
+        [({"lane": name}, item["rejected"]) for name, item in lane_stats.items()],
+    )
+    lines += render_samples(
+        "gst_api_lane_timeouts_total", "counter", "Jobs that hit the lane timeout.",
+        [({"lane": name}, item["timeouts"]) for name, item in lane_stats.items()],
+    )
+    return PlainTextResponse("\n".join(lines) + "\n", media_type="text/plain; version=0.0.4")
+
+
+# 미들웨어는 나중에 추가한 것이 바깥쪽에서 실행된다: 압축 → 메트릭 → ETag/304 → 라우트.
+# 안쪽 두 미들웨어는 순수 ASGI라 Content-Length가 붙은 완성된 본문이 그대로 압축기에 도달하므로,
+# COMPRESS_MIN_SIZE보다 작은 응답은 압축하지 않는다.
+app.add_middleware(HTTPCacheMiddleware)
+app.add_middleware(RequestMetricsMiddleware)
+if BrotliMiddleware is not None:
+    app.add_middleware(
+        BrotliMiddleware, quality=BROTLI_QUALITY, minimum_size=COMPRESS_MIN_SIZE, gzip_fallback=True
+    )
+else:
+    app.add_middleware(GZipMiddleware, minimum_size=COMPRESS_MIN_SIZE, compresslevel=GZIP_LEVEL)
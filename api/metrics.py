@@ -0,0 +1,106 @@
+"""
+API 요청 계측
+-------------
+라우트별 지연 시간, SQLite 실행 시간, 직렬화 시간, 반환 행 수를 히스토그램으로 모아
+`/metrics`에서 Prometheus 텍스트 포맷으로 노출한다.
+
+요청 단위 누적값은 `request_stats` ContextVar에 담긴다. `QueryLane`은 작업을 제출할 때
+컨텍스트를 복사하므로 워커 스레드에서 실행되는 쿼리도 같은 요청의 값에 더해진다.
+"""
+
+from __future__ import annotations
+
+import threading
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Dict, Iterable, List, Optional, Tuple
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+ROW_BUCKETS = (0, 1, 5, 10, 25, 50, 100, 200, 500)
+
+request_stats: ContextVar[Optional[Dict[str, float]]] = ContextVar("request_stats", default=None)
+
+
+def new_request_stats() -> Dict[str, float]:
+    return {"sqlite_seconds": 0.0, "serialize_seconds": 0.0, "rows": 0, "queries": 0}
+
+
+def add_request_stat(key: str, value: float) -> None:
+    stats = request_stats.get()
+    if stats is not None:
+        stats[key] += value
+
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, buckets: Iterable[float]):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._series: Dict[LabelKey, List] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            index = bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted(self._series.items())
+            items = [(key, list(counts), total, count) for key, (counts, total, count) in items]
+        for key, counts, total, count in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{format_labels(key, le=format_number(bound))} {cumulative}")
+            lines.append(f"{self.name}_bucket{format_labels(key, le='+Inf')} {count}")
+            lines.append(f"{self.name}_sum{format_labels(key)} {format_number(total)}")
+            lines.append(f"{self.name}_count{format_labels(key)} {count}")
+        return lines
+
+
+def format_number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def format_labels(key: LabelKey, **extra: str) -> str:
+    pairs = list(key) + list(extra.items())
+    if not pairs:
+        return ""
+    body = ",".join(
+        '{}="{}"'.format(name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in pairs
+    )
+    return "{" + body + "}"
+
+
+def render_samples(name: str, kind: str, help_text: str, samples: Iterable[Tuple[Dict[str, str], float]]) -> List[str]:
+    """풀/레인 상태처럼 조회 시점에 읽는 gauge/counter 값을 Prometheus 텍스트로 변환한다."""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+    for labels, value in samples:
+        lines.append(f"{name}{format_labels(tuple(sorted(labels.items())))} {format_number(value)}")
+    return lines
+
+
+REQUEST_LATENCY = Histogram(
+    "gst_api_request_duration_seconds", "End-to-end request latency per route.", LATENCY_BUCKETS
+)
+SQLITE_TIME = Histogram(
+    "gst_api_sqlite_duration_seconds", "Time spent executing SQLite statements per request.", LATENCY_BUCKETS
+)
+SERIALIZE_TIME = Histogram(
+    "gst_api_serialize_duration_seconds", "Time spent rendering the JSON body per request.", LATENCY_BUCKETS
+)
+ROWS_RETURNED = Histogram("gst_api_rows_returned", "Rows fetched from SQLite per request.", ROW_BUCKETS)
+HISTOGRAMS = (REQUEST_LATENCY, SQLITE_TIME, SERIALIZE_TIME, ROWS_RETURNED)
@@ -1,5 +1,6 @@
 PRAGMA foreign_keys = ON;
 
+DROP TABLE IF EXISTS patent_facets;
 DROP TABLE IF EXISTS patent_keywords;
 DROP TABLE IF EXISTS patent_inventors;
 DROP TABLE IF EXISTS patent_pages;
@@ -61,6 +62,14 @@ CREATE TABLE patent_images (
 CREATE INDEX idx_patents_category ON patents(category);
 CREATE INDEX idx_patents_status ON patents(status);
 CREATE INDEX idx_patents_registration_date ON patents(registration_date);
+CREATE INDEX idx_patents_registration_date_id ON patents(registration_date, id);
+-- 카테고리/상태 필터 목록도 정렬 없이 커서 위치에서 바로 탐색하도록
+CREATE INDEX idx_patents_category_registration_date_id ON patents(category, registration_date, id);
+CREATE INDEX idx_patents_status_registration_date_id ON patents(status, registration_date, id);
+CREATE INDEX idx_patent_inventors_patent_id ON patent_inventors(patent_id);
+CREATE INDEX idx_patent_keywords_patent_id ON patent_keywords(patent_id);
+CREATE INDEX idx_patent_pages_patent_id ON patent_pages(patent_id, page_number);
+CREATE INDEX idx_patent_images_patent_id ON patent_images(patent_id, page_number);
 
 CREATE VIRTUAL TABLE patent_search USING fts5(
     patent_id UNINDEXED,
@@ -69,3 +78,59 @@ CREATE VIRTUAL TABLE patent_search USING fts5(
     technology_field,
     full_text
 );
+
+-- 대시보드 집계(/stats, /stats/facets)용 물리화 테이블. 아래 트리거가 patents 변경 시 갱신한다.
+-- NULL 값은 빈 문자열 버킷으로 집계된다.
+CREATE TABLE patent_facets (
+    facet TEXT NOT NULL,
+    value TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (facet, value)
+) WITHOUT ROWID;
+
+CREATE TRIGGER trg_patents_facets_insert AFTER INSERT ON patents
+BEGIN
+    INSERT INTO patent_facets (facet, value, count) VALUES ('category', COALESCE(NEW.category, ''), 1)
+        ON CONFLICT (facet, value) DO UPDATE SET count = count + 1;
+    INSERT INTO patent_facets (facet, value, count) VALUES ('status', COALESCE(NEW.status, ''), 1)
+        ON CONFLICT (facet, value) DO UPDATE SET count = count + 1;
+    INSERT INTO patent_facets (facet, value, count) VALUES ('year', COALESCE(substr(NEW.registration_date, 1, 4), ''), 1)
+        ON CONFLICT (facet, value) DO UPDATE SET count = count + 1;
+    INSERT INTO patent_facets (facet, value, count) VALUES ('technology_field', COALESCE(NEW.technology_field, ''), 1)
+        ON CONFLICT (facet, value) DO UPDATE SET count = count + 1;
+END;
+
+CREATE TRIGGER trg_patents_facets_delete AFTER DELETE ON patents
+BEGIN
+    UPDATE patent_facets SET count = count - 1
+        WHERE facet = 'category' AND value = COALESCE(OLD.category, '');
+    UPDATE patent_facets SET count = count - 1
+        WHERE facet = 'status' AND value = COALESCE(OLD.status, '');
+    UPDATE patent_facets SET count = count - 1
+        WHERE facet = 'year' AND value = COALESCE(substr(OLD.registration_date, 1, 4), '');
+    UPDATE patent_facets SET count = count - 1
+        WHERE facet = 'technology_field' AND value = COALESCE(OLD.technology_field, '');
+    DELETE FROM patent_facets WHERE count <= 0;
+END;
+
+CREATE TRIGGER trg_patents_facets_update
+AFTER UPDATE OF category, status, registration_date, technology_field ON patents
+BEGIN
+    UPDATE patent_facets SET count = count - 1
+        WHERE facet = 'category' AND value = COALESCE(OLD.category, '');
+    UPDATE patent_facets SET count = count - 1
+        WHERE facet = 'status' AND value = COALESCE(OLD.status, '');
+    UPDATE patent_facets SET count = count - 1
+        WHERE facet = 'year' AND value = COALESCE(substr(OLD.registration_date, 1, 4), '');
+    UPDATE patent_facets SET count = count - 1
+        WHERE facet = 'technology_field' AND value = COALESCE(OLD.technology_field, '');
+    DELETE FROM patent_facets WHERE count <= 0;
+    INSERT INTO patent_facets (facet, value, count) VALUES ('category', COALESCE(NEW.category, ''), 1)
+        ON CONFLICT (facet, value) DO UPDATE SET count = count + 1;
+    INSERT INTO patent_facets (facet, value, count) VALUES ('status', COALESCE(NEW.status, ''), 1)
+        ON CONFLICT (facet, value) DO UPDATE SET count = count + 1;
+    INSERT INTO patent_facets (facet, value, count) VALUES ('year', COALESCE(substr(NEW.registration_date, 1, 4), ''), 1)
+        ON CONFLICT (facet, value) DO UPDATE SET count = count + 1;
+    INSERT INTO patent_facets (facet, value, count) VALUES ('technology_field', COALESCE(NEW.technology_field, ''), 1)
+        ON CONFLICT (facet, value) DO UPDATE SET count = count + 1;
+END;
@@ -0,0 +1,155 @@
+"""
+의미 기반 답변 캐시
+-----------------
+자주 반복되는 질문(스크러버, 칠러, 플라즈마 버너 등)에 대해 LLM 답변을 재사용합니다.
+
+적중 조건:
+    1. 질문 임베딩의 코사인 유사도 ≥ ANSWER_CACHE_THRESHOLD
+    2. 이번 검색으로 찾은 청크 ID 집합이 캐시 항목과 동일
+    3. 답변에 영향을 주는 설정(모델, top_k, 웹 검색 여부 등)이 동일
+    4. 캐시 항목이 만들어진 이후 코퍼스가 다시 수집되지 않음
+
+코퍼스 버전은 CORPUS_VERSION_PATH 파일의 내용으로 관리합니다. sync_rag_outputs/로컬 인덱스 재생성이
+`bump_corpus_version()`으로 값을 바꾸면, 다른 프로세스(Streamlit 앱)에서도 다음 조회 시 캐시가 비워집니다.
+
+환경 변수:
+    ANSWER_CACHE_ENABLED      (기본 true)
+    ANSWER_CACHE_THRESHOLD    (기본 0.95)
+    ANSWER_CACHE_TTL          초 단위 (기본 21600 = 6시간)
+    ANSWER_CACHE_MAX_ENTRIES  (기본 256)
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, FrozenSet, Hashable, Optional, Sequence, Tuple
+
+import numpy as np
+
+from rag.common import CACHE_DIR, process_singleton
+
+CORPUS_VERSION_PATH = CACHE_DIR / "corpus_version"
+
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() in {"1", "true", "yes"}
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "21600"))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "256"))
+
+
+def corpus_version() -> str:
+    try:
+        return CORPUS_VERSION_PATH.read_text(encoding="utf-8").strip()
+    except FileNotFoundError:
+        return ""
+
+
+def bump_corpus_version() -> str:
+    """재수집 후 호출한다. 이 값이 바뀌면 모든 프로세스의 답변 캐시가 무효화된다."""
+    version = f"{time.time():.6f}-{uuid.uuid4().hex[:8]}"
+    CORPUS_VERSION_PATH.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = CORPUS_VERSION_PATH.with_name(CORPUS_VERSION_PATH.name + ".tmp")
+    tmp_path.write_text(version, encoding="utf-8")
+    os.replace(tmp_path, CORPUS_VERSION_PATH)
+    return version
+
+
+@dataclass
+class CachedAnswer:
+    vector: np.ndarray
+    chunk_ids: FrozenSet[str]
+    settings: Hashable
+    payload: Dict[str, Any]
+    created_at: float
+
+
+class AnswerCache:
+    """질문 임베딩 유사도 + 청크 ID 집합 기반 LRU/TTL 캐시 (프로세스 내)."""
+
+    def __init__(
+        self,
+        threshold: float = ANSWER_CACHE_THRESHOLD,
+        ttl_seconds: float = ANSWER_CACHE_TTL,
+        max_entries: int = ANSWER_CACHE_MAX_ENTRIES,
+    ):
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[int, CachedAnswer]" = OrderedDict()
+        self._next_id = 0
+        self._version = corpus_version()
+        self._lock = threading.Lock()
+        self.stats: Dict[str, int] = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    @staticmethod
+    def _normalize(vector: Sequence[float]) -> np.ndarray:
+        array = np.asarray(vector, dtype=np.float32)
+        norm = float(np.linalg.norm(array))
+        return array / norm if norm else array
+
+    def _check_version(self) -> None:
+        version = corpus_version()
+        if version != self._version:
+            self._entries.clear()
+            self._version = version
+            self.stats["invalidations"] += 1
+
+    def lookup(
+        self, vector: Sequence[float], chunk_ids: Sequence[str], settings: Hashable
+    ) -> Optional[Tuple[Dict[str, Any], float]]:
+        """조건을 만족하는 가장 유사한 항목의 (payload, 유사도). 없으면 None."""
+        query = self._normalize(vector)
+        wanted = frozenset(chunk_ids)
+        now = time.time()
+        with self._lock:
+            self._check_version()
+            best_key, best_similarity = None, -1.0
+            for key, entry in list(self._entries.items()):
+                if now - entry.created_at > self.ttl_seconds:
+                    del self._entries[key]
+                    continue
+                if entry.settings != settings or entry.chunk_ids != wanted or entry.vector.shape != query.shape:
+                    continue
+                similarity = float(entry.vector @ query)
+                if similarity >= self.threshold and similarity > best_similarity:
+                    best_key, best_similarity = key, similarity
+            if best_key is None:
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(best_key)
+            self.stats["hits"] += 1
+            return self._entries[best_key].payload, best_similarity
+
+    def store(
+        self, vector: Sequence[float], chunk_ids: Sequence[str], settings: Hashable, payload: Dict[str, Any]
+    ) -> None:
+        with self._lock:
+            self._check_version()
+            self._entries[self._next_id] = CachedAnswer(
+                vector=self._normalize(vector),
+                chunk_ids=frozenset(chunk_ids),
+                settings=settings,
+                payload=payload,
+                created_at=time.time(),
+            )
+            self._next_id += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def summary(self) -> Dict[str, int]:
+        with self._lock:
+            return {**self.stats, "size": len(self._entries)}
+
+
+@process_singleton
+def get_answer_cache() -> Optional[AnswerCache]:
+    """프로세스 공용 답변 캐시. ANSWER_CACHE_ENABLED가 꺼져 있으면 None."""
+    return AnswerCache() if ANSWER_CACHE_ENABLED else None
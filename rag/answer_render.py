@@ -0,0 +1,70 @@
+"""
+답변 HTML 렌더링
+---------------
+LLM 답변 텍스트를 채팅 말풍선용 HTML(<p>/<ul><li>)로 변환합니다.
+
+스트리밍 중에는 `IncrementalAnswerRenderer`가 줄바꿈으로 끝난 블록을 한 번만 변환해
+누적해 두고, 아직 열려 있는 마지막 줄만 매번 다시 변환합니다. 결과는 전체 텍스트에
+`sanitize_text`를 적용한 것과 동일합니다.
+"""
+
+from __future__ import annotations
+
+from html import escape
+from typing import List, Tuple
+
+
+def _render_line(line: str, in_list: bool) -> Tuple[List[str], bool]:
+    """한 줄(앞뒤 공백 제거 전)을 HTML 조각과 다음 줄의 목록 상태로 변환한다."""
+    line = line.strip()
+    if not line:
+        return (["</ul>"], False) if in_list else ([], False)
+    if line.startswith("- "):
+        parts = [] if in_list else ["<ul>"]
+        parts.append(f"<li>{escape(line[2:])}</li>")
+        return parts, True
+    parts = ["</ul>"] if in_list else []
+    parts.append(f"<p>{escape(line)}</p>")
+    return parts, False
+
+
+def sanitize_text(content: str) -> str:
+    html_lines: List[str] = []
+    in_list = False
+    for raw_line in content.split("\n"):
+        parts, in_list = _render_line(raw_line, in_list)
+        html_lines.extend(parts)
+    if in_list:
+        html_lines.append("</ul>")
+    return "\n".join(html_lines) or "<p></p>"
+
+
+class IncrementalAnswerRenderer:
+    """토큰 단위로 텍스트를 받아 완료된 줄은 캐시하고 마지막 줄만 다시 렌더링한다."""
+
+    def __init__(self):
+        self._closed_html = ""
+        self._in_list = False
+        self._tail = ""
+
+    def feed(self, delta: str) -> str:
+        """delta를 덧붙이고 현재까지의 전체 HTML을 돌려준다."""
+        *finished, self._tail = (self._tail + delta).split("\n")
+        if finished:
+            added: List[str] = []
+            for line in finished:
+                parts, self._in_list = _render_line(line, self._in_list)
+                added.extend(parts)
+            if added:
+                added_html = "\n".join(added)
+                self._closed_html = f"{self._closed_html}\n{added_html}" if self._closed_html else added_html
+        return self.html()
+
+    def html(self) -> str:
+        parts, in_list = _render_line(self._tail, self._in_list)
+        if in_list:
+            parts.append("</ul>")
+        if not parts:
+            return self._closed_html or "<p></p>"
+        tail_html = "\n".join(parts)
+        return f"{self._closed_html}\n{tail_html}" if self._closed_html else tail_html
@@ -0,0 +1,44 @@
+"""
+RAG 모듈 공용 설정
+-----------------
+디스크 캐시/인덱스/트레이스 파일의 기본 위치와, 프로세스 공용 인스턴스를 만드는 헬퍼를 한곳에 둡니다.
+
+    @process_singleton
+    def get_embedding_cache() -> Optional[EmbeddingCache]:
+        return EmbeddingCache() if EMBEDDING_CACHE_ENABLED else None
+
+환경 변수:
+    RAG_CACHE_DIR  (기본 <저장소>/.cache)
+"""
+
+from __future__ import annotations
+
+import functools
+import os
+import threading
+from pathlib import Path
+from typing import Callable, Optional, TypeVar
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+CACHE_DIR = Path(os.getenv("RAG_CACHE_DIR", ROOT_DIR / ".cache"))
+
+T = TypeVar("T")
+
+
+def process_singleton(factory: Callable[[], Optional[T]]) -> Callable[[], Optional[T]]:
+    """factory가 처음 돌려준 인스턴스를 프로세스 안에서 공유하는 함수로 감싼다. (스레드 안전)
+
+    factory가 None을 돌려주면(기능 비활성화) 기억하지 않고 그대로 None을 돌려준다.
+    """
+    instance: Optional[T] = None
+    lock = threading.Lock()
+
+    @functools.wraps(factory)
+    def get() -> Optional[T]:
+        nonlocal instance
+        with lock:
+            if instance is None:
+                instance = factory()
+            return instance
+
+    return get
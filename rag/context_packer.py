@@ -0,0 +1,221 @@
+"""
+토큰 예산 기반 문맥 패킹
+-----------------------
+검색된 특허 청크와 웹 결과를 프롬프트에 넣기 전에 토큰 예산 안으로 정리합니다.
+
+1. 같은 문서(doc_id)의 같은 페이지 청크, 내용이 같은 청크는 상위 순위 하나만 남긴다.
+2. 청크가 청크당 상한보다 길면 질문 용어가 나온 위치 주변만 잘라 " … "로 잇는다.
+3. 특허 문맥 → 웹 결과 순으로 남은 예산만큼 채우고, 넘치는 항목은 제외한다.
+4. 섹션별 토큰 수를 보고서로 돌려준다.
+
+토큰 수는 tiktoken이 설치되어 있으면 채팅 모델의 인코딩으로, 없으면 문자 종류별 근사치로 계산합니다.
+
+환경 변수:
+    CONTEXT_TOKEN_BUDGET      특허+웹 문맥 전체 예산 (기본 3000)
+    CONTEXT_CHUNK_MAX_TOKENS  청크 하나의 최대 토큰 (기본 600)
+    CONTEXT_WEB_SHARE         웹 결과에 배정할 최대 비율 (기본 0.25)
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import re
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Tuple
+
+try:
+    import tiktoken
+except ImportError:  # tiktoken이 없으면 근사치로 계산한다.
+    tiktoken = None
+
+from rag.lexical_index import TERM_STRIP
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000"))
+CONTEXT_CHUNK_MAX_TOKENS = int(os.getenv("CONTEXT_CHUNK_MAX_TOKENS", "600"))
+CONTEXT_WEB_SHARE = float(os.getenv("CONTEXT_WEB_SHARE", "0.25"))
+
+# 이보다 적게 남으면 청크를 잘라 넣지 않고 중단한다.
+MIN_CHUNK_TOKENS = 60
+HIT_WINDOW_CHARS = 160
+ELLIPSIS = " … "
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=8)
+def _encoding(model: str):
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+
+
+def make_token_counter(model: str) -> Callable[[str], int]:
+    encoding = _encoding(model)
+    if encoding is not None:
+        return lambda text: len(encoding.encode(text))
+    return estimate_tokens
+
+
+def estimate_tokens(text: str) -> int:
+    """tiktoken이 없을 때의 근사치: ASCII는 4자당 1토큰, 한글/한자/가나는 글자당 1토큰."""
+    ascii_chars = sum(1 for char in text if char.isascii())
+    return (ascii_chars + 3) // 4 + (len(text) - ascii_chars)
+
+
+def query_terms(question: str) -> List[str]:
+    terms: List[str] = []
+    for raw in question.split():
+        term = TERM_STRIP.sub("", raw).casefold()
+        if len(term) < 2:
+            continue
+        terms.append(term)
+        # 조사가 붙은 한국어 단어("스크러버의")도 본문의 "스크러버"와 일치하도록 끝 글자를 뺀 형태를 추가
+        if not term.isascii() and len(term) > 2:
+            terms.append(term[:-1])
+    return terms
+
+
+def trim_to_hits(text: str, terms: List[str], max_tokens: int, count_tokens: Callable[[str], int]) -> str:
+    """질문 용어 주변 구간만 남겨 max_tokens 이하로 줄인다. 일치 위치가 없으면 앞부분을 남긴다."""
+    text = _WHITESPACE.sub(" ", text).strip()
+    if count_tokens(text) <= max_tokens:
+        return text
+
+    lowered = text.casefold()
+    spans: List[Tuple[int, int]] = []
+    for term in terms:
+        start = lowered.find(term)
+        while start != -1:
+            spans.append((max(0, start - HIT_WINDOW_CHARS), min(len(text), start + len(term) + HIT_WINDOW_CHARS)))
+            start = lowered.find(term, start + len(term))
+    if not spans:
+        spans = [(0, len(text))]
+
+    spans.sort()
+    merged = [spans[0]]
+    for start, end in spans[1:]:
+        if start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+
+    pieces: List[str] = []
+    used = 0
+    truncated = False
+    for start, end in merged:
+        piece = text[start:end].strip()
+        cost = count_tokens(piece) + (count_tokens(ELLIPSIS) if pieces else 0)
+        if used + cost > max_tokens:
+            remaining = max_tokens - used
+            if remaining >= MIN_CHUNK_TOKENS // 2:
+                pieces.append(_cut_to_tokens(piece, remaining, count_tokens))
+            truncated = True
+            break
+        pieces.append(piece)
+        used += cost
+    if not pieces:
+        return _cut_to_tokens(text[merged[0][0]:], max_tokens, count_tokens)
+
+    trimmed = ELLIPSIS.join(pieces)
+    if merged[0][0] > 0:
+        trimmed = "…" + trimmed
+    if truncated or merged[-1][1] < len(text):
+        trimmed += "…"
+    return trimmed
+
+
+def _cut_to_tokens(text: str, max_tokens: int, count_tokens: Callable[[str], int]) -> str:
+    """문자 단위 이분 탐색으로 max_tokens 이하가 되는 가장 긴 앞부분을 찾는다."""
+    low, high = 0, len(text)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if count_tokens(text[:middle]) <= max_tokens:
+            low = middle
+        else:
+            high = middle - 1
+    return text[:low]
+
+
+@dataclass
+class PackedContext:
+    contexts: List[Dict]
+    web_results: List[Dict]
+    report: Dict[str, int] = field(default_factory=dict)
+
+
+def pack_context(
+    question: str,
+    contexts: List[Dict],
+    web_results: List[Dict],
+    model: str,
+    budget: int = CONTEXT_TOKEN_BUDGET,
+    chunk_max_tokens: int = CONTEXT_CHUNK_MAX_TOKENS,
+    web_share: float = CONTEXT_WEB_SHARE,
+    count_tokens: Optional[Callable[[str], int]] = None,
+) -> PackedContext:
+    """순위 순서를 유지한 채 중복 제거·트리밍·예산 적용한 문맥과 섹션별 토큰 보고서를 돌려준다."""
+    count_tokens = count_tokens or make_token_counter(model)
+    terms = query_terms(question)
+    report = {
+        "budget": budget,
+        "patent_tokens": 0,
+        "web_tokens": 0,
+        "chunks_in": len(contexts),
+        "chunks_used": 0,
+        "chunks_trimmed": 0,
+        "chunks_duplicate": 0,
+        "chunks_over_budget": 0,
+        "web_in": len(web_results),
+        "web_used": 0,
+    }
+
+    # 웹 결과가 있으면 예산 일부를 웹에 남겨 둔다. 특허 쪽이 덜 쓰면 남은 만큼 웹이 더 쓴다.
+    patent_budget = budget - int(budget * web_share) if web_results else budget
+
+    packed_contexts: List[Dict] = []
+    seen_pages = set()
+    seen_contents = set()
+    for ctx in contexts:
+        content = ctx.get("content") or ctx.get("text") or ""
+        page_key = (ctx.get("doc_id"), ctx.get("page")) if ctx.get("doc_id") else None
+        content_key = hashlib.sha1(_WHITESPACE.sub(" ", content).strip().encode("utf-8")).hexdigest()
+        if (page_key is not None and page_key in seen_pages) or content_key in seen_contents:
+            report["chunks_duplicate"] += 1
+            continue
+
+        remaining = patent_budget - report["patent_tokens"]
+        if remaining < MIN_CHUNK_TOKENS:
+            report["chunks_over_budget"] += 1
+            continue
+        trimmed = trim_to_hits(content, terms, min(chunk_max_tokens, remaining), count_tokens)
+        tokens = count_tokens(trimmed)
+        if trimmed != _WHITESPACE.sub(" ", content).strip():
+            report["chunks_trimmed"] += 1
+
+        if page_key is not None:
+            seen_pages.add(page_key)
+        seen_contents.add(content_key)
+        packed = ctx.copy()
+        packed["content"] = trimmed
+        packed["content_tokens"] = tokens
+        packed_contexts.append(packed)
+        report["patent_tokens"] += tokens
+        report["chunks_used"] += 1
+
+    packed_web: List[Dict] = []
+    web_budget = budget - report["patent_tokens"]
+    for item in web_results:
+        entry_tokens = count_tokens(f"{item.get('title') or ''} {item.get('snippet') or ''} {item.get('link') or ''}")
+        if report["web_tokens"] + entry_tokens > web_budget:
+            continue
+        packed_web.append(item)
+        report["web_tokens"] += entry_tokens
+        report["web_used"] += 1
+
+    report["context_tokens"] = report["patent_tokens"] + report["web_tokens"]
+    return PackedContext(packed_contexts, packed_web, report)
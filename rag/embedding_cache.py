@@ -0,0 +1,263 @@
+"""
+쿼리 임베딩 캐시
+---------------
+동일하거나 정규화하면 같은 질문에 대해 OpenAI 임베딩 API를 다시 호출하지 않도록
+2단 캐시(프로세스 내 LRU + 디스크 SQLite)를 제공합니다.
+
+- 키: sha256(모델 | 차원 | 정규화된 텍스트)
+- 디스크 저장: float32 BLOB, 생성 시각 기준 TTL, 최근 사용 시각 기준 최대 개수 제한
+  (정리는 최대 개수를 10% 넘었을 때 몰아서, 사용 시각 갱신은 모아서 기록)
+- 적중/미스 카운터는 Streamlit 사이드바에 표시됩니다.
+
+환경 변수:
+    EMBEDDING_CACHE_ENABLED        (기본 true)
+    EMBEDDING_CACHE_PATH           (기본 .cache/embeddings.sqlite3)
+    EMBEDDING_CACHE_TTL_DAYS       (기본 30)
+    EMBEDDING_CACHE_MAX_ENTRIES    (기본 50000, 디스크)
+    EMBEDDING_CACHE_MEMORY_ENTRIES (기본 512, 메모리)
+    CHUNK_EMBEDDING_CACHE_PATH     (기본 .cache/chunk_embeddings.sqlite3, 인덱스 생성용 청크 임베딩)
+    CHUNK_EMBEDDING_CACHE_MAX_ENTRIES (기본 200000, 디스크)
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from rag.common import CACHE_DIR, process_singleton
+
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() in {"1", "true", "yes"}
+EMBEDDING_CACHE_PATH = Path(os.getenv("EMBEDDING_CACHE_PATH", CACHE_DIR / "embeddings.sqlite3"))
+EMBEDDING_CACHE_TTL_DAYS = float(os.getenv("EMBEDDING_CACHE_TTL_DAYS", "30"))
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "50000"))
+EMBEDDING_CACHE_MEMORY_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MEMORY_ENTRIES", "512"))
+# 디스크 항목이 최대 개수를 이 비율만큼 넘으면 한꺼번에 정리한다.
+EMBEDDING_CACHE_EVICT_SLACK = 0.1
+# 디스크 적중 시각(last_used)을 이만큼 모이면 바로 기록한다.
+EMBEDDING_CACHE_TOUCH_BATCH = 64
+CHUNK_EMBEDDING_CACHE_PATH = Path(os.getenv("CHUNK_EMBEDDING_CACHE_PATH", CACHE_DIR / "chunk_embeddings.sqlite3"))
+CHUNK_EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("CHUNK_EMBEDDING_CACHE_MAX_ENTRIES", "200000"))
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """유니코드 정규화(NFKC), 대소문자 통일, 공백 축약으로 사실상 같은 질문을 같은 키로 만든다."""
+    normalized = unicodedata.normalize("NFKC", text or "").casefold()
+    return _WHITESPACE.sub(" ", normalized).strip()
+
+
+def cache_key(model: str, dimension: Optional[int], text: str) -> str:
+    raw = f"{model}|{dimension}|{normalize_text(text)}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _to_blob(vector: Sequence[float]) -> bytes:
+    return array("f", vector).tobytes()
+
+
+def _from_blob(blob: bytes) -> List[float]:
+    values = array("f")
+    values.frombytes(blob)
+    return values.tolist()
+
+
+class EmbeddingCache:
+    """메모리 LRU + SQLite 디스크 캐시."""
+
+    def __init__(
+        self,
+        path: Optional[Path] = EMBEDDING_CACHE_PATH,
+        ttl_seconds: float = EMBEDDING_CACHE_TTL_DAYS * 86400,
+        max_entries: int = EMBEDDING_CACHE_MAX_ENTRIES,
+        memory_entries: int = EMBEDDING_CACHE_MEMORY_ENTRIES,
+    ):
+        self.path = Path(path) if path else None
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+        self._memory: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._rows = 0
+        # 디스크 적중 시각은 모아 두었다가 쓰기/정리 때 한 번에 반영한다 (적중마다 UPDATE+commit 하지 않음).
+        self._touches: Dict[str, float] = {}
+        self.stats: Dict[str, int] = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "writes": 0}
+
+    def _db(self) -> Optional[sqlite3.Connection]:
+        if self.path is None:
+            return None
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS embeddings (
+                       key TEXT PRIMARY KEY,
+                       model TEXT NOT NULL,
+                       dimension INTEGER,
+                       vector BLOB NOT NULL,
+                       created_at REAL NOT NULL,
+                       last_used REAL NOT NULL
+                   )"""
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings(last_used)")
+            self._rows = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            self._conn = conn
+        return self._conn
+
+    def _remember(self, key: str, vector: List[float]) -> None:
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, model: str, dimension: Optional[int], text: str) -> Optional[List[float]]:
+        key = cache_key(model, dimension, text)
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return vector
+
+            conn = self._db()
+            if conn is not None:
+                row = conn.execute(
+                    "SELECT vector, created_at FROM embeddings WHERE key = ?", (key,)
+                ).fetchone()
+                now = time.time()
+                if row is not None and now - row[1] <= self.ttl_seconds:
+                    self._touches[key] = now
+                    if len(self._touches) >= EMBEDDING_CACHE_TOUCH_BATCH:
+                        self._flush_touches(conn)
+                        conn.commit()
+                    vector = _from_blob(row[0])
+                    self._remember(key, vector)
+                    self.stats["disk_hits"] += 1
+                    return vector
+                if row is not None:
+                    conn.execute("DELETE FROM embeddings WHERE key = ?", (key,))
+                    conn.commit()
+                    self._touches.pop(key, None)
+                    self._rows -= 1
+
+            self.stats["misses"] += 1
+            return None
+
+    def put(self, model: str, dimension: Optional[int], text: str, vector: Sequence[float]) -> None:
+        self.put_many(model, dimension, [(text, vector)])
+
+    def put_many(
+        self, model: str, dimension: Optional[int], items: Sequence[Tuple[str, Sequence[float]]]
+    ) -> None:
+        """(텍스트, 벡터) 목록을 한 트랜잭션으로 기록한다."""
+        rows = []
+        now = time.time()
+        with self._lock:
+            for text, vector in items:
+                key = cache_key(model, dimension, text)
+                vector = list(vector)
+                self._remember(key, vector)
+                rows.append((key, model, dimension, _to_blob(vector), now, now))
+            conn = self._db()
+            if conn is None or not rows:
+                return
+            conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, model, dimension, vector, created_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            self.stats["writes"] += len(rows)
+            # 덮어쓴 키도 더하므로 실제보다 클 수 있다. 정리할 때 정확한 값으로 다시 센다.
+            self._rows += len(rows)
+            self._flush_touches(conn)
+            if self._rows > self.max_entries * (1 + EMBEDDING_CACHE_EVICT_SLACK):
+                self._evict(conn, now)
+            conn.commit()
+
+    def flush(self) -> None:
+        """모아 둔 디스크 적중 시각을 기록한다."""
+        with self._lock:
+            if self._conn is not None and self._touches:
+                self._flush_touches(self._conn)
+                self._conn.commit()
+
+    def _flush_touches(self, conn: sqlite3.Connection) -> None:
+        if self._touches:
+            conn.executemany(
+                "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                [(used, key) for key, used in self._touches.items()],
+            )
+            self._touches.clear()
+
+    def _evict(self, conn: sqlite3.Connection, now: float) -> None:
+        """만료 항목을 지우고, 최근 사용 순으로 max_entries개만 남긴다.
+
+        매 쓰기마다가 아니라 개수가 max_entries를 EMBEDDING_CACHE_EVICT_SLACK 비율만큼 넘었을 때만 호출되므로
+        전체를 훑는 DELETE 비용이 여러 쓰기에 나뉜다.
+        """
+        conn.execute("DELETE FROM embeddings WHERE created_at < ?", (now - self.ttl_seconds,))
+        conn.execute(
+            "DELETE FROM embeddings WHERE key IN ("
+            "SELECT key FROM embeddings ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+        self._rows = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def get_or_embed(
+        self,
+        model: str,
+        dimension: Optional[int],
+        texts: Sequence[str],
+        embed_fn: Callable[[List[str]], List[List[float]]],
+    ) -> List[List[float]]:
+        """캐시에 없는 텍스트만 모아 `embed_fn`을 한 번 호출하고, 입력 순서대로 벡터를 돌려준다."""
+        results: List[Optional[List[float]]] = [self.get(model, dimension, text) for text in texts]
+        pending: Dict[str, List[int]] = {}
+        for idx, vector in enumerate(results):
+            if vector is None:
+                pending.setdefault(normalize_text(texts[idx]), []).append(idx)
+        if pending:
+            positions = list(pending.values())
+            vectors = embed_fn([texts[group[0]] for group in positions])
+            self.put_many(model, dimension, [(texts[group[0]], vector) for group, vector in zip(positions, vectors)])
+            for group, vector in zip(positions, vectors):
+                for idx in group:
+                    results[idx] = list(vector)
+        return results  # type: ignore[return-value]
+
+    def summary(self) -> Dict[str, int]:
+        with self._lock:
+            hits = self.stats["memory_hits"] + self.stats["disk_hits"]
+            return {**self.stats, "hits": hits, "memory_size": len(self._memory)}
+
+
+@process_singleton
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    """프로세스 공용 쿼리 임베딩 캐시. EMBEDDING_CACHE_ENABLED가 꺼져 있으면 None."""
+    return EmbeddingCache() if EMBEDDING_CACHE_ENABLED else None
+
+
+def get_chunk_embedding_cache() -> Optional[EmbeddingCache]:
+    """인덱스 생성용 청크 임베딩 캐시. 쿼리 캐시와 파일·LRU·통계를 공유하지 않는다.
+
+    청크는 한 번 임베딩하면 다음 재생성 때까지 다시 읽히지 않으므로 메모리 LRU는 쓰지 않는다.
+    """
+    if not EMBEDDING_CACHE_ENABLED:
+        return None
+    return EmbeddingCache(
+        path=CHUNK_EMBEDDING_CACHE_PATH,
+        max_entries=CHUNK_EMBEDDING_CACHE_MAX_ENTRIES,
+        memory_entries=0,
+    )
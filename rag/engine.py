@@ -0,0 +1,884 @@
+"""
+GST 특허 RAG 엔진
+----------------
+Streamlit UI와 분리된 검색 + 답변 파이프라인입니다. `streamlit_app.py`는 이 엔진을 st.cache_resource로
+한 번 만들어 쓰고, `scripts/batch_query.py`는 같은 엔진으로 평가용 질문 세트를 일괄 처리합니다.
+
+    engine = RAGEngine.from_env()
+    result = engine.run_query("플라즈마 스크러버 특허는?")
+    summary = engine.run_batch([("q1", "..."), ("q2", "...")], Path("answers.jsonl"))
+
+단일 질의: 벡터/어휘/웹 검색 분기를 동시에 실행 → RRF 융합 → (선택) 재순위화 → 답변 캐시 조회
+→ 토큰 예산 패킹 → 스트리밍 완성.
+
+배치 질의:
+    1. 출력 JSONL에 이미 성공한 질문 ID는 건너뛴다 (중단된 실행 이어서 하기).
+    2. 남은 질문을 임베딩 API 한 번에 EMBED_BATCH_SIZE개씩 묶어 임베딩한다 (임베딩 캐시 경유).
+    3. 질문별 파이프라인을 BATCH_CONCURRENCY개 동시에 실행하고, 벡터 검색/완성 요청은 공유 속도 제한기를 거친다.
+    4. 끝난 순서대로 한 줄씩 기록하고 flush한다.
+
+환경 변수:
+    OPENAI_CHAT_MODEL        (기본 gpt-4o-mini)
+    WEB_SEARCH_ENABLED       (기본 true)
+    VECTOR_SEARCH_TIMEOUT    벡터/어휘 검색 제한 시간(초, 기본 20)
+    WEB_SEARCH_TIMEOUT       웹 검색 제한 시간(초, 기본 8)
+    WEB_STRATEGY_DEADLINE    웹 검색 전략 공통 마감 시간(초, 기본 6)
+    WEB_SEARCH_CACHE_TTL     웹 검색 결과 캐시 TTL(초, 기본 3600)
+    EMBED_BATCH_SIZE         임베딩 요청 한 번에 넣을 질문 수 (기본 64)
+    BATCH_CONCURRENCY        배치에서 동시에 처리할 질문 수 (기본 4)
+    BATCH_VECTOR_QPS         배치 벡터 검색 초당 상한, 0이면 무제한 (기본 10)
+    BATCH_COMPLETION_RPM     배치 완성 요청 분당 상한, 0이면 무제한 (기본 60)
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError, as_completed, wait
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from dotenv import load_dotenv
+from openai import OpenAI
+from pinecone import Pinecone
+
+from rag.answer_cache import AnswerCache, get_answer_cache
+from rag.context_packer import PackedContext, make_token_counter, pack_context
+from rag.embedding_cache import get_embedding_cache, normalize_text
+from rag.hybrid import HYBRID_CANDIDATE_MULTIPLIER, RETRIEVAL_MODE, reciprocal_rank_fusion
+from rag.lexical_index import cached_source_signature, get_lexical_index
+from rag.local_index import VECTOR_BACKEND
+from rag.rate_limit import RateLimiter
+from rag.rerank import RERANK_MODE, RERANK_OVERFETCH, rerank, rerank_enabled
+from rag.tracing import Trace, current_trace, span, submit_in_context
+from rag.ttl_cache import TTLCache
+from scripts.pinecone_ingest import (
+    EMBEDDING_DIMENSION,
+    EMBEDDING_MODEL,
+    PINECONE_API_KEY,
+    PINECONE_INDEX_NAME,
+    PINECONE_NAMESPACE,
+    RAG_OUTPUT_DIR,
+    load_jsonl_chunks,
+)
+
+load_dotenv()
+
+CHAT_MODEL = os.getenv("OPENAI_CHAT_MODEL", "gpt-4o-mini")
+WEB_SEARCH_ENABLED = os.getenv("WEB_SEARCH_ENABLED", "true").lower() == "true"
+# 검색 분기별 제한 시간(초). 초과한 분기는 결과 없이 답변을 진행한다.
+VECTOR_SEARCH_TIMEOUT = float(os.getenv("VECTOR_SEARCH_TIMEOUT", "20"))
+WEB_SEARCH_TIMEOUT = float(os.getenv("WEB_SEARCH_TIMEOUT", "8"))
+# 상위 전략들을 동시에 실행할 때의 공통 마감 시간(초)과 결과 캐시 TTL(초)
+WEB_STRATEGY_DEADLINE = float(os.getenv("WEB_STRATEGY_DEADLINE", "6"))
+WEB_SEARCH_CACHE_TTL = float(os.getenv("WEB_SEARCH_CACHE_TTL", "3600"))
+
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+BATCH_VECTOR_QPS = float(os.getenv("BATCH_VECTOR_QPS", "10"))
+BATCH_COMPLETION_RPM = float(os.getenv("BATCH_COMPLETION_RPM", "60"))
+
+SYSTEM_PROMPT = (
+    "당신은 GST 특허 데이터에 기반한 전문 분석 어시스턴트입니다. "
+    "주어진 문맥만을 사용해 질문에 답변하고, 확신이 없을 경우 사실대로 부족한 점을 말씀하세요. "
+    "항상 한국어로 응답하세요."
+)
+
+# 특허 번호 패턴 / 지역 키워드 (모듈 로드 시 한 번만 컴파일)
+PATENT_NUMBER_PATTERNS = {
+    'kr': re.compile(r'(KR|10-?\d{7})', re.IGNORECASE),
+    'jp': re.compile(r'(JP|特許|特開|特公)\s*[\d-]+', re.IGNORECASE),
+    'us': re.compile(r'(US|USD?)\s*[\d,]+', re.IGNORECASE),
+}
+KR_KEYWORDS = ('스크러버', '칠러', '플라즈마', '반도체')
+JP_KEYWORDS = ('日本', 'スクラバー', 'チラー')
+US_KEYWORDS = ('scrubber', 'chiller', 'plasma')
+PATENT_OFFICE_DOMAINS = (
+    'patents.go.kr', 'kipris.or.kr',
+    'j-platpat.inpit.go.jp',
+    'patents.google.com', 'uspto.gov',
+    'espacenet.com', 'epo.org',
+)
+
+
+def create_clients():
+    """VECTOR_BACKEND에 맞는 (벡터 인덱스, OpenAI 클라이언트)를 만든다."""
+    openai_client = OpenAI()
+    if VECTOR_BACKEND == "local":
+        # Pinecone과 같은 query() 인터페이스를 제공하는 로컬 memmap 인덱스
+        from rag.local_index import LocalVectorIndex
+
+        local_index = LocalVectorIndex().load()
+        if local_index.model != EMBEDDING_MODEL or local_index.dimension != EMBEDDING_DIMENSION:
+            raise RuntimeError(
+                f"로컬 인덱스({local_index.model}, {local_index.dimension}차원)가 현재 임베딩 설정"
+                f"({EMBEDDING_MODEL}, {EMBEDDING_DIMENSION}차원)과 다릅니다. scripts/build_local_index.py를 다시 실행하세요."
+            )
+        return local_index, openai_client
+
+    if not PINECONE_API_KEY:
+        raise RuntimeError("Pinecone API Key가 설정되어 있지 않습니다 (.env 파일을 확인하세요).")
+    pinecone_client = Pinecone(api_key=PINECONE_API_KEY)
+    pinecone_index = pinecone_client.Index(PINECONE_INDEX_NAME)
+    return pinecone_index, openai_client
+
+
+def load_lexical_records():
+    return ((chunk.chunk_id, chunk.text, chunk.metadata) for chunk in load_jsonl_chunks(RAG_OUTPUT_DIR))
+
+
+SCORE_LABELS = (("rerank_score", "재순위화", ".3f"), ("rrf_score", "RRF", ".4f"), ("score", "벡터 유사도", ".3f"))
+
+
+def describe_scores(meta: Dict) -> str:
+    """문맥 점수를 '벡터 유사도 0.812 · RRF 0.0325 (정렬 기준)'처럼 표시한다.
+
+    `score`는 항상 벡터 검색기의 유사도이며 어휘 검색에서만 찾은 청크에는 없다. 문맥 순서는
+    재순위화 점수 → RRF 점수(하이브리드) → 벡터 유사도 중 있는 첫 번째 점수를 따른다.
+    """
+    present = [(key, label, spec) for key, label, spec in SCORE_LABELS if meta.get(key) is not None]
+    if not present:
+        return "정보 없음"
+    order_key = present[0][0]
+    parts = [
+        f"{label} {meta[key]:{spec}}" + (" (정렬 기준)" if key == order_key else "")
+        for key, label, spec in reversed(present)
+    ]
+    if meta.get("score") is None:
+        parts.insert(0, "어휘 검색 결과")
+    return " · ".join(parts)
+
+
+def build_prompt(question: str, contexts: List[Dict], web_results: List[Dict]) -> Tuple[str, PackedContext]:
+    """문맥을 토큰 예산에 맞게 패킹한 뒤 태그를 붙여 프롬프트를 만든다. (프롬프트, 패킹 결과) 반환."""
+    packed = pack_context(question, contexts, web_results, CHAT_MODEL)
+    for idx, ctx in enumerate(packed.contexts, start=1):
+        ctx["tag"] = f"특허{idx}"
+    packed.web_results = [{**item, "tag": f"웹{idx}"} for idx, item in enumerate(packed.web_results, start=1)]
+    contexts, web_results = packed.contexts, packed.web_results
+
+    context_blocks = []
+    for ctx in contexts:
+        content = ctx.get("content") or ""
+        title = ctx.get("title") or ctx.get("doc_id") or "미상 특허"
+        page = ctx.get("page")
+        tag = ctx.get("tag", "특허")
+        header = f"[{tag}] 문서: {title}"
+        if page is not None:
+            header += f", 페이지 {page}"
+        block = f"{header}\n점수: {describe_scores(ctx)}\n내용:\n{content}"
+        context_blocks.append(block.strip())
+
+    combined_context = "\n\n".join(context_blocks)
+
+    web_block = ""
+    if web_results:
+        entries = []
+        for item in web_results:
+            title = item.get("title") or "웹 검색 결과"
+            snippet = item.get("snippet") or ""
+            link = item.get("link") or ""
+            tag = item.get("tag", "웹")
+            entry = f"[{tag}] 제목: {title}\n요약: {snippet}\n링크: {link}"
+            entries.append(entry.strip())
+        web_block = "\n\n".join(entries)
+
+    prompt = (
+        f"{SYSTEM_PROMPT}\n\n"
+        f"[특허 문맥]\n{combined_context if combined_context else '관련 특허 문맥이 제공되지 않았습니다.'}\n\n"
+    )
+
+    if web_block:
+        prompt += f"[웹 검색 결과]\n{web_block}\n\n"
+
+    prompt += (
+        f"[사용자 질문]\n{question}\n\n"
+        "응답 시에는 다음을 포함하세요:\n"
+        "- 핵심 요약\n"
+        "- 상세 설명\n"
+        "- 사용한 모든 근거에 대해 해당 태그를 대괄호로 인용 (예: [특허1], [웹2])\n"
+        "- 답변 마지막에 '출처:' 섹션을 만들고 사용한 태그를 제목과 함께 bullet 리스트로 정리\n"
+        "- 추론 근거가 부족한 경우, 추가 정보 필요성을 명시"
+    )
+    packed.report["prompt_tokens"] = make_token_counter(CHAT_MODEL)(prompt)
+    return prompt, packed
+
+
+def detect_regions(query: str) -> List[str]:
+    return [region for region, pattern in PATENT_NUMBER_PATTERNS.items() if pattern.search(query)]
+
+
+def build_search_strategies(query: str, detected_regions: List[str]) -> List[Dict]:
+    search_strategies = []
+    lowered = query.lower()
+
+    # 1. 한국 특허 검색 전략
+    if not detected_regions or 'kr' in detected_regions or any(keyword in lowered for keyword in KR_KEYWORDS):
+        search_strategies.append({
+            'query': f'{query} site:patents.go.kr OR site:kipris.or.kr',
+            'region': '🇰🇷 한국특허청',
+            'priority': 10
+        })
+        search_strategies.append({
+            'query': f'{query} 특허 한국',
+            'region': '🇰🇷 한국',
+            'priority': 8
+        })
+
+    # 2. 일본 특허 검색 전략
+    if 'jp' in detected_regions or any(keyword in query for keyword in JP_KEYWORDS):
+        search_strategies.append({
+            'query': f'{query} site:j-platpat.inpit.go.jp',
+            'region': '🇯🇵 일본특허청',
+            'priority': 10
+        })
+        search_strategies.append({
+            'query': f'{query} 特許 日本',
+            'region': '🇯🇵 일본',
+            'priority': 8
+        })
+
+    # 3. 미국 특허 검색 전략
+    if 'us' in detected_regions or any(keyword in lowered for keyword in US_KEYWORDS):
+        search_strategies.append({
+            'query': f'{query} site:patents.google.com OR site:uspto.gov',
+            'region': '🇺🇸 미국특허청',
+            'priority': 10
+        })
+        search_strategies.append({
+            'query': f'{query} patent USA',
+            'region': '🇺🇸 미국',
+            'priority': 8
+        })
+
+    # 4. 유럽 및 국제 특허 검색
+    search_strategies.append({
+        'query': f'{query} site:espacenet.com OR site:epo.org',
+        'region': '🇪🇺 유럽특허청',
+        'priority': 6
+    })
+
+    # 5. 일반 특허 검색 (폴백)
+    search_strategies.append({
+        'query': f'{query} patent OR 特許 OR 특허',
+        'region': '🌐 글로벌',
+        'priority': 5
+    })
+
+    # 우선순위 정렬
+    search_strategies.sort(key=lambda x: x['priority'], reverse=True)
+    return search_strategies
+
+
+def run_search_strategy(strategy: Dict, max_results: int) -> List[Dict]:
+    """DDGS 세션은 스레드 간에 공유하지 않고 전략마다 새로 연다.
+
+    마감 시간을 넘긴 future는 취소되지 않고 web_search_executor 작업자를 계속 차지하므로,
+    HTTP 요청 자체에 WEB_STRATEGY_DEADLINE 제한을 걸어 응답 없는 호출이 작업자를 붙잡지 못하게 한다.
+    """
+    from duckduckgo_search import DDGS
+
+    print(f"[웹 검색] {strategy['region']} - 쿼리: {strategy['query'][:50]}...")
+    results = []
+    with span(f"web_search:{strategy['region']}") as record:
+        with DDGS(timeout=WEB_STRATEGY_DEADLINE) as ddgs:
+            for idx, result in enumerate(ddgs.text(strategy['query'], max_results=max_results)):
+                if idx >= max_results:
+                    break
+                results.append(result)
+        record["attributes"]["results"] = len(results)
+    return results
+
+
+def question_id(question: str) -> str:
+    """ID가 없는 질문의 안정적인 ID (정규화한 질문의 sha1 앞 12자리)."""
+    return hashlib.sha1(normalize_text(question).encode("utf-8")).hexdigest()[:12]
+
+
+def read_questions(path: Path) -> List[Tuple[str, str]]:
+    """질문 파일을 (ID, 질문) 목록으로 읽는다.
+
+    .jsonl: 줄마다 {"id": ..., "question": ...} ("id"가 없으면 질문 해시). 그 외: 한 줄에 질문 하나.
+    빈 줄과 #으로 시작하는 줄은 건너뛴다.
+    """
+    questions: List[Tuple[str, str]] = []
+    is_jsonl = Path(path).suffix == ".jsonl"
+    with Path(path).open("r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if is_jsonl:
+                try:
+                    item = json.loads(line)
+                except json.JSONDecodeError as exc:
+                    raise ValueError(f"{path}:{line_no} JSON 파싱 실패: {exc}") from exc
+                question = str(item.get("question") or "").strip()
+                if not question:
+                    raise ValueError(f"{path}:{line_no} 'question' 필드가 없습니다.")
+                questions.append((str(item.get("id") or question_id(question)), question))
+            else:
+                questions.append((question_id(line), line))
+    return questions
+
+
+def completed_ids(output_path: Path) -> Set[str]:
+    """출력 JSONL에서 성공적으로 기록된 질문 ID. 중단으로 잘린 마지막 줄과 오류 기록은 제외한다."""
+    done: Set[str] = set()
+    if not Path(output_path).exists():
+        return done
+    with Path(output_path).open("r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if record.get("error") is None and record.get("id") is not None:
+                done.add(str(record["id"]))
+    return done
+
+
+def batch_record(qid: str, question: str, result: Dict) -> Dict[str, Any]:
+    """run_query 결과에서 평가에 필요한 필드만 추린 JSONL 한 줄 (청크 본문은 제외).
+
+    벡터 검색이 시간을 초과해 벡터 문맥 없이 만든 답변은 답변을 남기되 "error"를 채워, 성공으로 세지 않고
+    다음 실행에서 다시 시도되게 한다.
+    """
+    timings = result.get("timings") or {}
+    error = None
+    if "vector_timeout" in timings:
+        error = f"VectorSearchTimeout: 벡터 검색이 {timings['vector_timeout']:.1f}초를 초과해 벡터 문맥 없이 답변함"
+    return {
+        "id": qid,
+        "question": question,
+        "answer": result["answer"],
+        "sources": [
+            {
+                "tag": meta.get("tag"),
+                "chunk_id": meta.get("chunk_id"),
+                "doc_id": meta.get("doc_id"),
+                "title": meta.get("title"),
+                "page": meta.get("page"),
+                "score": meta.get("score"),
+                "rrf_score": meta.get("rrf_score"),
+                "rerank_score": meta.get("rerank_score"),
+            }
+            for meta in result["matches"]
+        ],
+        "web_results": result["web_results"],
+        "model_used": result.get("model_used"),
+        "tokens_used": result.get("tokens_used"),
+        "cached": result.get("cached", False),
+        "context_report": result.get("context_report"),
+        "timings": result.get("timings"),
+        "trace_id": result.get("trace_id"),
+        "error": error,
+    }
+
+
+class RAGEngine:
+    """벡터 인덱스와 OpenAI 클라이언트를 감싼 RAG 파이프라인. 스레드 풀과 웹 검색 캐시를 소유한다."""
+
+    def __init__(
+        self,
+        index,
+        client: OpenAI,
+        retrieval_workers: int = 4,
+        vector_limiter: Optional[RateLimiter] = None,
+        completion_limiter: Optional[RateLimiter] = None,
+        use_answer_cache: bool = True,
+    ):
+        self.index = index
+        self.client = client
+        # 벡터 검색과 웹 검색을 동시에 실행하기 위한 스레드 풀 (질의 간 재사용)
+        self.retrieval_executor = ThreadPoolExecutor(max_workers=retrieval_workers, thread_name_prefix="rag-retrieval")
+        self.web_search_executor = ThreadPoolExecutor(max_workers=3, thread_name_prefix="web-search")
+        self._web_executor_lock = threading.Lock()
+        self.web_search_cache = TTLCache(ttl_seconds=WEB_SEARCH_CACHE_TTL, max_entries=256)
+        self.vector_limiter = vector_limiter
+        self.completion_limiter = completion_limiter
+        # 평가 배치처럼 매번 새로 답해야 하는 경우 use_answer_cache=False
+        self.answer_cache: Optional[AnswerCache] = get_answer_cache() if use_answer_cache else None
+
+    @classmethod
+    def from_env(cls, **kwargs) -> "RAGEngine":
+        index, client = create_clients()
+        return cls(index, client, **kwargs)
+
+    def close(self) -> None:
+        self.retrieval_executor.shutdown(wait=False, cancel_futures=True)
+        with self._web_executor_lock:
+            self.web_search_executor.shutdown(wait=False, cancel_futures=True)
+        cache = get_embedding_cache()
+        if cache is not None:
+            cache.flush()
+
+    def embed_texts(self, texts: Sequence[str], batch_size: int = EMBED_BATCH_SIZE) -> List[List[float]]:
+        """캐시에 없는 텍스트만 batch_size개씩 묶어 임베딩 API를 호출하고, 입력 순서대로 벡터를 돌려준다."""
+
+        def call(batch: List[str]) -> List[List[float]]:
+            vectors: List[List[float]] = []
+            for start in range(0, len(batch), batch_size):
+                response = self.client.embeddings.create(model=EMBEDDING_MODEL, input=batch[start:start + batch_size])
+                vectors.extend(item.embedding for item in response.data)
+            return vectors
+
+        cache = get_embedding_cache()
+        if cache is None:
+            return call(list(texts))
+        return cache.get_or_embed(EMBEDDING_MODEL, EMBEDDING_DIMENSION, list(texts), call)
+
+    def embed_text(self, text: str) -> List[float]:
+        return self.embed_texts([text])[0]
+
+    def _retire_web_executor(self, executor: ThreadPoolExecutor) -> None:
+        """마감을 넘긴 전략이 작업자를 붙잡고 있는 풀을 새 풀로 바꾼다.
+
+        이미 실행 중인 DDGS 호출은 취소할 수 없으므로, 다음 검색이 그 뒤에 줄 서지 않도록 새 풀에 제출한다.
+        이전 풀의 스레드는 남은 호출이 HTTP 제한 시간 안에 끝나면 정리된다.
+        """
+        with self._web_executor_lock:
+            if self.web_search_executor is executor:
+                self.web_search_executor = ThreadPoolExecutor(max_workers=3, thread_name_prefix="web-search")
+        executor.shutdown(wait=False)
+
+    def web_search(self, query: str, max_results: int = 4) -> List[Dict]:
+        """
+        특허 전문 웹 검색 기능 - 한국/일본/미국/기타 특허청 최적화
+
+        검색 소스:
+        - 한국특허청 (KIPRIS): patents.go.kr
+        - 일본특허청 (J-PlatPat): j-platpat.inpit.go.jp
+        - 미국특허청 (USPTO): patents.google.com, uspto.gov
+        - 유럽특허청 (EPO): espacenet.com
+        - 일반 웹 검색 (DuckDuckGo)
+
+        상위 3개 전략은 공통 마감 시간(WEB_STRATEGY_DEADLINE) 안에서 동시에 실행하고,
+        결과는 (정규화된 질문, 감지된 지역, 결과 수) 단위로 WEB_SEARCH_CACHE_TTL 동안 재사용합니다.
+
+        주의: 웹 검색은 특허 검색을 보완하는 용도로만 사용됩니다.
+        실제 특허 정보는 Pinecone 벡터 DB에서 가져옵니다.
+        """
+        if not WEB_SEARCH_ENABLED:
+            return []
+
+        try:
+            import duckduckgo_search  # noqa: F401
+        except ImportError:
+            print("[웹 검색] duckduckgo_search 라이브러리가 설치되지 않았습니다.")
+            print("[웹 검색] pip install duckduckgo-search 실행 필요")
+            return []
+
+        detected_regions = detect_regions(query)
+        cache = self.web_search_cache
+        cache_key = (normalize_text(query), tuple(sorted(detected_regions)), max_results)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            print(f"[웹 검색] '{query}' - 캐시 적중 ({len(cached)}개 결과)")
+            return [item.copy() for item in cached]
+
+        all_results = []
+        seen_links = set()
+
+        try:
+            search_strategies = build_search_strategies(query, detected_regions)[:3]  # 상위 3개 전략만 실행
+            results_per_strategy = max(2, max_results // len(search_strategies))
+
+            with self._web_executor_lock:
+                executor = self.web_search_executor
+                futures = [
+                    submit_in_context(executor, run_search_strategy, strategy, results_per_strategy)
+                    for strategy in search_strategies
+                ]
+            done, not_done = wait(futures, timeout=WEB_STRATEGY_DEADLINE)
+            for future in not_done:
+                future.cancel()
+            if not_done:
+                self._retire_web_executor(executor)
+
+            # 완료 순서와 관계없이 전략 우선순위 순서대로 병합
+            for strategy, future in zip(search_strategies, futures):
+                if future not in done:
+                    print(f"[웹 검색] {strategy['region']} 전략이 {WEB_STRATEGY_DEADLINE:.1f}초 안에 끝나지 않았습니다.")
+                    continue
+                try:
+                    strategy_results = future.result()
+                except Exception as strategy_error:
+                    print(f"[웹 검색] {strategy['region']} 전략 실패: {strategy_error}")
+                    continue
+
+                for result in strategy_results:
+                    # 중복 제거
+                    url = result.get("href", "")
+                    if url in seen_links:
+                        continue
+                    seen_links.add(url)
+
+                    all_results.append({
+                        "title": result.get("title", ""),
+                        "snippet": result.get("body", "")[:300],
+                        "link": url,
+                        "region": strategy['region'],
+                        "priority": strategy['priority']
+                    })
+
+                    if len(all_results) >= max_results:
+                        break
+
+                if len(all_results) >= max_results:
+                    break
+
+            # 우선순위 및 관련성 기반 정렬 (특허청 사이트 우선)
+            all_results.sort(key=lambda x: (
+                x.get('priority', 0),
+                1 if any(domain in x['link'] for domain in PATENT_OFFICE_DOMAINS) else 0
+            ), reverse=True)
+
+            # 결과 제한
+            all_results = all_results[:max_results]
+
+            # 검색 결과 로깅
+            if all_results:
+                print(f"[웹 검색] '{query}' - {len(all_results)}개 결과 발견")
+                for idx, result in enumerate(all_results, 1):
+                    print(f"  {idx}. [{result.get('region', '🌐')}] {result['title'][:50]}...")
+                cache.put(cache_key, [item.copy() for item in all_results])
+            else:
+                print(f"[웹 검색] '{query}' - 검색 결과 없음")
+
+            return all_results
+
+        except Exception as e:
+            print(f"[웹 검색] 오류 발생: {type(e).__name__} - {str(e)}")
+            return []
+
+    def run_query(
+        self,
+        question: str,
+        top_k: int = 5,
+        include_web: bool = True,
+        web_results_limit: int = 4,
+        on_token: Optional[Callable[[str], None]] = None,
+        trace: Optional[Trace] = None,
+        query_vector: Optional[List[float]] = None,
+    ) -> Dict:
+        """질의 하나를 처리한다. 단계별 소요 시간은 trace의 span으로 기록된다.
+
+        trace를 넘기면 호출자가 렌더링 span을 추가한 뒤 finish()로 기록하고,
+        넘기지 않으면 여기서 만든 트레이스를 반환 직전에 기록한다.
+        query_vector를 넘기면(배치에서 미리 임베딩한 경우) 임베딩 단계를 건너뛴다.
+        """
+        owns_trace = trace is None
+        if trace is None:
+            trace = Trace("run_query", question=question)
+        trace.attributes.update(
+            top_k=top_k, retrieval_mode=RETRIEVAL_MODE, rerank_mode=RERANK_MODE, include_web=include_web
+        )
+        context_token = current_trace.set(trace)
+        try:
+            result = self._run_query(question, top_k, include_web, web_results_limit, on_token, trace, query_vector)
+        finally:
+            current_trace.reset(context_token)
+
+        trace.attributes.update(cached=result.get("cached", False), web_results=len(result["web_results"]))
+        result["trace_id"] = trace.trace_id
+        if owns_trace:
+            result["trace"] = trace.finish()
+        return result
+
+    def _run_query(
+        self,
+        question: str,
+        top_k: int,
+        include_web: bool,
+        web_results_limit: int,
+        on_token: Optional[Callable[[str], None]],
+        trace: Trace,
+        query_vector: Optional[List[float]],
+    ) -> Dict:
+        client, index = self.client, self.index
+        executor = self.retrieval_executor
+        timings: Dict[str, float] = {}
+        started = time.perf_counter()
+
+        hybrid = RETRIEVAL_MODE == "hybrid"
+        # 재순위화를 켜면 top_k의 RERANK_OVERFETCH배를 후보로 모은 뒤 상위 top_k만 남긴다.
+        pool_k = top_k * RERANK_OVERFETCH if rerank_enabled() else top_k
+        candidate_k = max(pool_k, top_k * HYBRID_CANDIDATE_MULTIPLIER) if hybrid else pool_k
+        query_state: Dict[str, List[float]] = {}
+
+        def vector_branch() -> List[Tuple[str, Dict]]:
+            vector = query_vector
+            if vector is None:
+                with span("embed"):
+                    vector = self.embed_text(question)
+            query_state["vector"] = vector
+
+            if self.vector_limiter is not None:
+                with span("rate_limit:vector") as record:
+                    record["attributes"]["waited"] = self.vector_limiter.acquire()
+            with span("vector_query", backend=VECTOR_BACKEND, top_k=candidate_k) as record:
+                query_response = index.query(
+                    namespace=PINECONE_NAMESPACE,
+                    vector=vector,
+                    top_k=candidate_k,
+                    include_metadata=True,
+                    include_values=False,
+                )
+                record["attributes"]["matches"] = len(query_response.matches or [])
+
+            results = []
+            for match in query_response.matches or []:
+                metadata = match.metadata or {}
+                metadata = metadata.copy()
+                metadata.setdefault("score", match.score)
+                metadata["vector_score"] = match.score
+                results.append((str(metadata.get("chunk_id") or match.id), metadata))
+            return results
+
+        def lexical_branch() -> List[Tuple[str, Dict]]:
+            with span("lexical_query", top_k=candidate_k) as record:
+                lexical_index = get_lexical_index()
+                lexical_index.ensure(cached_source_signature(RAG_OUTPUT_DIR), load_lexical_records)
+                results = []
+                for chunk_id, rank, metadata in lexical_index.search(question, candidate_k):
+                    metadata["bm25"] = rank
+                    results.append((chunk_id, metadata))
+                record["attributes"]["matches"] = len(results)
+                return results
+
+        def web_branch() -> List[Dict]:
+            with span("web_search", limit=web_results_limit) as record:
+                results = self.web_search(question, web_results_limit)
+                record["attributes"]["results"] = len(results)
+                return results
+
+        # 웹 검색/어휘 검색은 임베딩/벡터 검색 결과에 의존하지 않으므로 모든 분기를 동시에 실행한다.
+        # 워커 스레드의 span이 같은 트레이스에 기록되도록 컨텍스트를 복사해 제출한다.
+        vector_future = submit_in_context(executor, vector_branch)
+        lexical_future = submit_in_context(executor, lexical_branch) if hybrid else None
+        web_future = submit_in_context(executor, web_branch) if include_web else None
+
+        try:
+            vector_results = vector_future.result(timeout=VECTOR_SEARCH_TIMEOUT)
+        except FutureTimeoutError:
+            print(f"[검색] 벡터 검색이 {VECTOR_SEARCH_TIMEOUT:.1f}초를 초과해 특허 문맥 없이 진행합니다.")
+            timings["vector_timeout"] = VECTOR_SEARCH_TIMEOUT
+            vector_results = []
+
+        if lexical_future is not None:
+            remaining = max(0.0, VECTOR_SEARCH_TIMEOUT - (time.perf_counter() - started))
+            try:
+                lexical_results = lexical_future.result(timeout=remaining)
+            except FutureTimeoutError:
+                print(f"[검색] 어휘 검색이 {VECTOR_SEARCH_TIMEOUT:.1f}초를 초과해 벡터 결과만 사용합니다.")
+                timings["lexical_timeout"] = VECTOR_SEARCH_TIMEOUT
+                lexical_results = []
+            except Exception as exc:
+                print(f"[검색] 어휘 검색 실패, 벡터 결과만 사용합니다: {type(exc).__name__} - {exc}")
+                lexical_results = []
+            # 순서는 rrf_score를 따르고, score에는 벡터 유사도를 그대로 둔다 (describe_scores 참고).
+            matches = reciprocal_rank_fusion([("vector", vector_results), ("lexical", lexical_results)], pool_k)
+        else:
+            matches = [metadata for _, metadata in vector_results[:pool_k]]
+        trace.attributes["chunks_retrieved"] = len(matches)
+
+        if rerank_enabled():
+            candidate_count = len(matches)
+            with span("rerank", mode=RERANK_MODE, candidates=candidate_count):
+                matches = rerank(question, matches, top_k)
+            print(f"[재순위화] {RERANK_MODE}: 후보 {candidate_count}개 → {len(matches)}개 "
+                  f"({trace.durations()['rerank'] * 1000:.1f}ms)")
+
+        # 같은 청크 집합을 찾은 유사 질문의 답변이 있으면 웹 검색 대기와 LLM 호출을 건너뛴다.
+        answer_cache = self.answer_cache
+        chunk_ids = [str(metadata.get("chunk_id") or "") for metadata in matches]
+        cache_settings = (CHAT_MODEL, RETRIEVAL_MODE, RERANK_MODE, top_k, include_web, web_results_limit)
+        if answer_cache is not None and "vector" in query_state and matches:
+            with span("answer_cache_lookup") as record:
+                cached = answer_cache.lookup(query_state["vector"], chunk_ids, cache_settings)
+                record["attributes"]["hit"] = cached is not None
+            if cached is not None:
+                payload, similarity = cached
+                timings["retrieval"] = time.perf_counter() - started
+                timings["total"] = time.perf_counter() - started
+                print(f"[답변 캐시] 적중 (유사도 {similarity:.3f}) - LLM 호출 생략")
+                return {
+                    **payload,
+                    "cached": True,
+                    "cache_similarity": similarity,
+                    "tokens_used": 0,
+                    "timings": {**trace.durations(), **timings},
+                }
+
+        raw_web_results: List[Dict] = []
+        if web_future is not None:
+            remaining = max(0.0, WEB_SEARCH_TIMEOUT - (time.perf_counter() - started))
+            try:
+                raw_web_results = web_future.result(timeout=remaining)
+            except FutureTimeoutError:
+                print(f"[웹 검색] {WEB_SEARCH_TIMEOUT:.1f}초를 초과해 웹 결과 없이 진행합니다.")
+                timings["web_search_timeout"] = WEB_SEARCH_TIMEOUT
+        timings["retrieval"] = time.perf_counter() - started
+
+        with span("prompt_build") as record:
+            prompt, packed = build_prompt(question, matches, raw_web_results)
+            record["attributes"].update(packed.report)
+        matches, web_results = packed.contexts, packed.web_results
+        report = packed.report
+        trace.attributes.update(chunks_used=report["chunks_used"], prompt_tokens_estimate=report["prompt_tokens"])
+        print(
+            f"[문맥] 예산 {report['budget']} 토큰 · 특허 {report['patent_tokens']} "
+            f"({report['chunks_used']}/{report['chunks_in']}개, 중복 {report['chunks_duplicate']}, "
+            f"트리밍 {report['chunks_trimmed']}, 예산 초과 {report['chunks_over_budget']}) · "
+            f"웹 {report['web_tokens']} ({report['web_used']}/{report['web_in']}개) · 프롬프트 전체 {report['prompt_tokens']}"
+        )
+
+        if self.completion_limiter is not None:
+            with span("rate_limit:completion") as record:
+                record["attributes"]["waited"] = self.completion_limiter.acquire()
+
+        # OpenAI Chat Completion API 호출 (스트리밍: 토큰이 도착하는 대로 on_token에 전달)
+        with span("completion", model=CHAT_MODEL) as completion_span:
+            stream = client.chat.completions.create(
+                model=CHAT_MODEL,
+                messages=[
+                    {"role": "system", "content": SYSTEM_PROMPT},
+                    {"role": "user", "content": prompt},
+                ],
+                temperature=0.3,  # 일관된 답변을 위해 낮은 temperature
+                max_tokens=1500,
+                stream=True,
+                stream_options={"include_usage": True},  # 마지막 청크에 토큰 사용량 포함
+            )
+
+            parts: List[str] = []
+            usage = None
+            for chunk in stream:
+                if getattr(chunk, "usage", None) is not None:
+                    usage = chunk.usage
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if not delta:
+                    continue
+                if not parts:
+                    timings["first_token"] = time.perf_counter() - started
+                parts.append(delta)
+                if on_token is not None:
+                    on_token(delta)
+
+            if usage is not None:
+                completion_span["attributes"].update(
+                    prompt_tokens=usage.prompt_tokens, completion_tokens=usage.completion_tokens
+                )
+
+        answer_text = "".join(parts).strip()
+        timings["total"] = time.perf_counter() - started
+
+        # 토큰 사용량 로깅
+        if usage is not None:
+            trace.attributes.update(prompt_tokens=usage.prompt_tokens, completion_tokens=usage.completion_tokens)
+            print(f"[OpenAI] 모델: {CHAT_MODEL}, 토큰: {usage.total_tokens} "
+                  f"(입력: {usage.prompt_tokens}, 출력: {usage.completion_tokens})")
+        else:
+            print(f"[OpenAI] 모델: {CHAT_MODEL}, 스트림 응답에 토큰 사용량이 포함되지 않았습니다.")
+
+        result = {
+            "answer": answer_text,
+            "matches": matches,
+            "web_results": web_results,
+            "model_used": CHAT_MODEL,
+            "tokens_used": usage.total_tokens if usage is not None else None,
+            "timings": {**trace.durations(), **timings},
+            "context_report": report,
+            "cached": False,
+        }
+        if answer_cache is not None and "vector" in query_state and chunk_ids and answer_text:
+            answer_cache.store(
+                query_state["vector"],
+                chunk_ids,
+                cache_settings,
+                {key: result[key] for key in ("answer", "matches", "web_results", "model_used", "context_report")},
+            )
+        return result
+
+    def run_batch(
+        self,
+        questions: Iterable[Tuple[str, str]],
+        output_path: Path,
+        top_k: int = 5,
+        include_web: bool = False,
+        web_results_limit: int = 4,
+        concurrency: int = BATCH_CONCURRENCY,
+        embed_batch_size: int = EMBED_BATCH_SIZE,
+        resume: bool = True,
+    ) -> Dict[str, int]:
+        """(ID, 질문) 목록을 처리해 output_path에 JSONL로 기록하고 건수 요약을 돌려준다.
+
+        resume=True이면 출력 파일에 이미 성공한 ID를 건너뛰고 이어서 추가한다. 실패한 질문(벡터 검색 시간
+        초과로 문맥 없이 답한 질문 포함)은 "error" 필드와 함께 기록되며, 다음 실행에서 다시 시도된다.
+        """
+        output_path = Path(output_path)
+        done = completed_ids(output_path) if resume else set()
+        pending: List[Tuple[str, str]] = []
+        total = 0
+        seen: Set[str] = set()
+        for qid, question in questions:
+            total += 1
+            if qid in done or qid in seen:
+                continue
+            seen.add(qid)
+            pending.append((qid, question))
+        summary = {"total": total, "skipped": total - len(pending), "succeeded": 0, "failed": 0}
+        if not pending:
+            return summary
+
+        started = time.perf_counter()
+        vectors = self.embed_texts([question for _, question in pending], batch_size=embed_batch_size)
+        print(f"[배치] 질문 {len(pending)}개 임베딩 완료 ({time.perf_counter() - started:.1f}초)")
+
+        def answer_one(qid: str, question: str, vector: List[float]) -> Dict[str, Any]:
+            try:
+                result = self.run_query(
+                    question,
+                    top_k=top_k,
+                    include_web=include_web,
+                    web_results_limit=web_results_limit,
+                    query_vector=vector,
+                )
+            except Exception as exc:
+                return {"id": qid, "question": question, "answer": None, "error": f"{type(exc).__name__}: {exc}"}
+            return batch_record(qid, question, result)
+
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        mode = "a" if resume else "w"
+        if mode == "a" and output_path.exists() and output_path.stat().st_size:
+            # 중단으로 마지막 줄이 잘렸으면 새 기록이 그 줄에 이어 붙지 않도록 줄을 바꾼다.
+            with output_path.open("rb") as f:
+                f.seek(-1, os.SEEK_END)
+                needs_newline = f.read(1) != b"\n"
+        else:
+            needs_newline = False
+
+        with output_path.open(mode, encoding="utf-8") as out, ThreadPoolExecutor(
+            max_workers=max(1, concurrency), thread_name_prefix="rag-batch"
+        ) as pool:
+            if needs_newline:
+                out.write("\n")
+            futures = [pool.submit(answer_one, qid, question, vector) for (qid, question), vector in zip(pending, vectors)]
+            for future in as_completed(futures):
+                record = future.result()
+                out.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+                out.flush()
+                summary["failed" if record.get("error") else "succeeded"] += 1
+                finished = summary["succeeded"] + summary["failed"]
+                status = f"실패: {record['error']}" if record.get("error") else "완료"
+                print(f"[배치] {finished}/{len(pending)} {record['id']} {status}")
+
+        summary["seconds"] = round(time.perf_counter() - started, 2)
+        return summary
@@ -0,0 +1,46 @@
+"""
+하이브리드 검색 결과 융합
+-----------------------
+벡터 검색과 어휘(FTS5/bm25) 검색의 순위 목록을 Reciprocal Rank Fusion으로 합칩니다.
+
+    score(d) = Σ 1 / (k + rank_i(d))
+
+점수 척도가 서로 다른(코사인 유사도 vs bm25) 목록을 정규화 없이 합칠 수 있고,
+한쪽 목록에만 있는 청크도 순위에 따라 반영됩니다.
+
+환경 변수:
+    RETRIEVAL_MODE              hybrid(기본) | vector
+    HYBRID_RRF_K                (기본 60)
+    HYBRID_CANDIDATE_MULTIPLIER 각 검색기에서 top_k의 몇 배를 후보로 가져올지 (기본 3)
+"""
+
+from __future__ import annotations
+
+import os
+from typing import Dict, List, Sequence, Tuple
+
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid").lower()
+HYBRID_RRF_K = int(os.getenv("HYBRID_RRF_K", "60"))
+HYBRID_CANDIDATE_MULTIPLIER = int(os.getenv("HYBRID_CANDIDATE_MULTIPLIER", "3"))
+
+
+def reciprocal_rank_fusion(
+    ranked_lists: Sequence[Tuple[str, Sequence[Tuple[str, Dict]]]],
+    limit: int,
+    k: int = HYBRID_RRF_K,
+) -> List[Dict]:
+    """(검색기 이름, [(chunk_id, metadata), ...]) 목록을 융합해 상위 limit개 메타데이터를 돌려준다.
+
+    같은 청크가 여러 목록에 있으면 먼저 나온 검색기의 메타데이터를 사용하고,
+    `rrf_score`, `retrievers`(검색기별 순위)를 추가한다.
+    """
+    fused: Dict[str, Dict] = {}
+    for name, results in ranked_lists:
+        for rank, (chunk_id, metadata) in enumerate(results, start=1):
+            entry = fused.get(chunk_id)
+            if entry is None:
+                entry = fused[chunk_id] = {**metadata, "rrf_score": 0.0, "retrievers": {}}
+            entry["rrf_score"] += 1.0 / (k + rank)
+            entry["retrievers"][name] = rank
+    ordered = sorted(fused.values(), key=lambda item: item["rrf_score"], reverse=True)
+    return ordered[:limit]
@@ -0,0 +1,125 @@
+"""
+증분 수집 매니페스트
+-------------------
+Pinecone에 올린 청크를 로컬 SQLite에 기록해, `sync_rag_outputs`가 바뀐 청크만 임베딩/업서트하고
+사라진 청크만 삭제하도록 합니다.
+
+- 대상(target): "인덱스 이름/네임스페이스". 대상별로 따로 기록한다.
+- 청크마다 (chunk_id, Pinecone 벡터 ID, doc_id, sha256, 임베딩 모델, 차원)을 저장한다.
+- sha256은 청크 본문과 업서트되는 메타데이터를 함께 해시한다. 메타데이터만 바뀌어도 다시 업서트된다.
+- 모델/차원이 현재 설정과 다른 항목은 바뀐 것으로 본다.
+- 업서트가 끝난 배치마다 기록하므로, 중단된 동기화를 다시 실행하면 남은 청크만 처리한다.
+
+환경 변수:
+    INGEST_MANIFEST_PATH  (기본 .cache/ingest_manifest.sqlite3)
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, NamedTuple, Optional, Sequence, Tuple
+
+from rag.common import CACHE_DIR
+
+INGEST_MANIFEST_PATH = Path(os.getenv("INGEST_MANIFEST_PATH", CACHE_DIR / "ingest_manifest.sqlite3"))
+
+
+class ManifestEntry(NamedTuple):
+    vector_id: str
+    doc_id: Optional[str]
+    sha256: str
+    model: str
+    dimension: int
+
+
+def content_hash(text: str, metadata: Dict) -> str:
+    payload = json.dumps(metadata, ensure_ascii=False, sort_keys=True, default=str)
+    digest = hashlib.sha256()
+    digest.update(text.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(payload.encode("utf-8"))
+    return digest.hexdigest()
+
+
+class IngestManifest:
+    """대상별 청크 → (벡터 ID, 해시, 모델, 차원) 기록. 업서트 작업자 스레드에서 함께 쓴다."""
+
+    def __init__(self, path: Path = INGEST_MANIFEST_PATH):
+        self.path = Path(path)
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS chunks (
+                       target TEXT NOT NULL,
+                       chunk_id TEXT NOT NULL,
+                       vector_id TEXT NOT NULL,
+                       doc_id TEXT,
+                       sha256 TEXT NOT NULL,
+                       model TEXT NOT NULL,
+                       dimension INTEGER NOT NULL,
+                       updated_at REAL NOT NULL,
+                       PRIMARY KEY (target, chunk_id)
+                   )"""
+            )
+            self._conn = conn
+        return self._conn
+
+    def entries(self, target: str) -> Dict[str, ManifestEntry]:
+        with self._lock:
+            rows = self._db().execute(
+                "SELECT chunk_id, vector_id, doc_id, sha256, model, dimension FROM chunks WHERE target = ?",
+                (target,),
+            ).fetchall()
+        return {row[0]: ManifestEntry(*row[1:]) for row in rows}
+
+    def record(self, target: str, rows: Iterable[Tuple[str, str, Optional[str], str, str, int]]) -> None:
+        """(chunk_id, vector_id, doc_id, sha256, model, dimension) 목록을 기록한다."""
+        now = time.time()
+        values = [(target, *row, now) for row in rows]
+        with self._lock:
+            conn = self._db()
+            conn.executemany(
+                "INSERT OR REPLACE INTO chunks "
+                "(target, chunk_id, vector_id, doc_id, sha256, model, dimension, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                values,
+            )
+            conn.commit()
+
+    def remove(self, target: str, chunk_ids: Sequence[str]) -> None:
+        with self._lock:
+            conn = self._db()
+            conn.executemany(
+                "DELETE FROM chunks WHERE target = ? AND chunk_id = ?", [(target, chunk_id) for chunk_id in chunk_ids]
+            )
+            conn.commit()
+
+    def clear(self, target: str) -> None:
+        with self._lock:
+            conn = self._db()
+            conn.execute("DELETE FROM chunks WHERE target = ?", (target,))
+            conn.commit()
+
+    def count(self, target: str) -> int:
+        with self._lock:
+            return self._db().execute("SELECT COUNT(*) FROM chunks WHERE target = ?", (target,)).fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
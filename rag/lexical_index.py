@@ -0,0 +1,219 @@
+"""
+청크 단위 FTS5 어휘 인덱스
+-------------------------
+특허 번호(10-2720342, JP 2011-501429)나 IPC 코드(H01H 45/02)처럼 정확한 식별자가 포함된 질문은
+임베딩 검색보다 어휘 검색이 잘 찾습니다. 이 모듈은 rag_outputs/ 청크를 SQLite FTS5 테이블에 넣고
+bm25로 순위를 매깁니다.
+
+data/gst_patents.db의 patent_search는 특허 단위(본문 10,000자 절단)라 청크 ID가 없으므로,
+벡터 인덱스와 같은 청크를 같은 방식(FTS5 + bm25)으로 색인해 결과를 청크 ID로 바로 융합할 수 있게 합니다.
+
+- 토크나이저: trigram (한국어 조사/일본어 무공백 문장/하이픈 식별자의 부분 일치). 지원하지 않는
+  SQLite에서는 unicode61로 대체합니다.
+- 인덱스는 rag_outputs/*_pinecone_text.jsonl 파일의 (이름, 크기, 수정 시각) 서명이 바뀌면 다시 만듭니다.
+  서명 계산은 파일 전체를 stat하므로 질의마다 하지 않고 LEXICAL_SIGNATURE_TTL초 동안 재사용하며,
+  수집 스크립트가 동기화 후 `invalidate_source_signature()`로 바로 무효화합니다.
+
+환경 변수:
+    LEXICAL_INDEX_PATH     (기본 .cache/chunks_fts.sqlite3)
+    LEXICAL_SIGNATURE_TTL  rag_outputs 서명 재사용 시간(초, 기본 60)
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from rag.common import CACHE_DIR, process_singleton
+from rag.ttl_cache import TTLCache
+
+LEXICAL_INDEX_PATH = Path(os.getenv("LEXICAL_INDEX_PATH", CACHE_DIR / "chunks_fts.sqlite3"))
+LEXICAL_SIGNATURE_TTL = float(os.getenv("LEXICAL_SIGNATURE_TTL", "60"))
+
+# 제목 가중치를 본문보다 높게 (chunk_id, metadata 컬럼은 UNINDEXED)
+BM25_WEIGHTS = (0.0, 4.0, 1.0, 0.0)
+MAX_QUERY_TERMS = 32
+
+# 검색어 앞뒤의 구두점을 떼어 낸다 (context_packer의 문맥 강조어 추출도 같은 규칙을 쓴다).
+TERM_STRIP = re.compile(r"^[^\w]+|[^\w]+$")
+
+
+def source_signature(source_dir: Path, pattern: str = "*_pinecone_text.jsonl") -> str:
+    digest = hashlib.sha1()
+    for path in sorted(Path(source_dir).rglob(pattern)):
+        stat = path.stat()
+        digest.update(f"{path.relative_to(source_dir)}|{stat.st_size}|{stat.st_mtime_ns}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+_signature_cache = TTLCache(ttl_seconds=LEXICAL_SIGNATURE_TTL, max_entries=8)
+
+
+def cached_source_signature(source_dir: Path, pattern: str = "*_pinecone_text.jsonl") -> str:
+    """source_signature를 LEXICAL_SIGNATURE_TTL초 동안 재사용한다. 질의 경로에서 파일 시스템 순회를 뺀다."""
+    key = (str(source_dir), pattern)
+    signature = _signature_cache.get(key)
+    if signature is None:
+        signature = source_signature(source_dir, pattern)
+        _signature_cache.put(key, signature)
+    return signature
+
+
+def invalidate_source_signature() -> None:
+    """rag_outputs가 바뀐 직후 호출해 다음 질의에서 서명을 다시 계산하게 한다."""
+    _signature_cache.clear()
+
+
+def build_match_query(question: str, trigram: bool = True, identifiers_only: bool = False) -> Optional[str]:
+    """사용자 질문을 FTS5 MATCH 식(용어 OR 결합)으로 변환한다. 검색할 용어가 없으면 None.
+
+    공백 단위 용어는 양끝 구두점만 제거해 하이픈/슬래시가 들어간 식별자를 그대로 유지한다.
+    trigram 토크나이저에서는 4자 이상 용어에 3자 창을 추가해 조사가 붙은 한국어 단어도 부분 일치시킨다.
+    identifiers_only=True이면 숫자가 포함된 용어(특허 번호, IPC 코드)만 사용한다.
+    """
+    terms: List[str] = []
+    seen = set()
+
+    def add(term: str) -> None:
+        if term and term not in seen and len(terms) < MAX_QUERY_TERMS:
+            seen.add(term)
+            terms.append(term)
+
+    for raw in question.split():
+        term = TERM_STRIP.sub("", raw)
+        if not term:
+            continue
+        if trigram and len(term) < 3:
+            continue
+        if identifiers_only:
+            if any(char.isdigit() for char in term):
+                add(term)
+            continue
+        add(term)
+        if trigram and len(term) > 3 and not term.isascii():
+            for start in range(len(term) - 2):
+                add(term[start:start + 3])
+
+    if not terms:
+        return None
+    return " OR ".join('"' + term.replace('"', '""') + '"' for term in terms)
+
+
+class ChunkLexicalIndex:
+    """rag_outputs 청크를 담은 FTS5 테이블. 스레드 간 연결 하나를 잠금으로 공유한다."""
+
+    def __init__(self, path: Path = LEXICAL_INDEX_PATH):
+        self.path = Path(path)
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self.trigram = True
+
+    def _open(self) -> Optional[sqlite3.Connection]:
+        if self._conn is None and self.path.exists():
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            row = conn.execute("SELECT value FROM meta WHERE key = 'tokenizer'").fetchone()
+            self.trigram = bool(row and row[0] == "trigram")
+            self._conn = conn
+        return self._conn
+
+    def signature(self) -> Optional[str]:
+        with self._lock:
+            conn = self._open()
+            if conn is None:
+                return None
+            row = conn.execute("SELECT value FROM meta WHERE key = 'signature'").fetchone()
+            return row[0] if row else None
+
+    def ensure(
+        self,
+        signature: str,
+        records_factory: Callable[[], Iterable[Tuple[str, str, Dict]]],
+    ) -> bool:
+        """서명이 다르면 (chunk_id, text, metadata) 레코드로 인덱스를 다시 만든다. 재생성 여부 반환."""
+        if self.signature() == signature:
+            return False
+        with self._build_lock:
+            if self.signature() == signature:
+                return False
+            self.build(records_factory(), signature)
+        return True
+
+    def build(self, records: Iterable[Tuple[str, str, Dict]], signature: str) -> int:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+        conn = sqlite3.connect(tmp_path)
+        tokenizer = "trigram"
+        try:
+            conn.execute(
+                "CREATE VIRTUAL TABLE chunks USING fts5("
+                "chunk_id UNINDEXED, title, content, metadata UNINDEXED, tokenize='trigram')"
+            )
+        except sqlite3.OperationalError:
+            tokenizer = "unicode61"
+            conn.execute(
+                "CREATE VIRTUAL TABLE chunks USING fts5(chunk_id UNINDEXED, title, content, metadata UNINDEXED)"
+            )
+        conn.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)")
+
+        count = 0
+        rows = []
+        for chunk_id, text, metadata in records:
+            rows.append((chunk_id, str(metadata.get("title") or ""), text, json.dumps(metadata, ensure_ascii=False)))
+            count += 1
+        conn.executemany("INSERT INTO chunks (chunk_id, title, content, metadata) VALUES (?, ?, ?, ?)", rows)
+        conn.executemany(
+            "INSERT INTO meta (key, value) VALUES (?, ?)",
+            [("signature", signature), ("tokenizer", tokenizer), ("count", str(count))],
+        )
+        conn.execute("INSERT INTO chunks (chunks) VALUES ('optimize')")
+        conn.commit()
+        conn.close()
+
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+            os.replace(tmp_path, self.path)
+        return count
+
+    def search(self, question: str, limit: int = 10) -> List[Tuple[str, float, Dict]]:
+        """(chunk_id, bm25 점수, metadata) 목록. bm25는 작을수록 관련성이 높다.
+
+        질문에 식별자가 있으면 식별자만으로 찾은 청크를 앞에 두고, 나머지를 전체 용어 검색 결과로 채운다.
+        일반 용어(예: 제목에 자주 나오는 기술명)의 bm25가 드문 식별자 일치를 밀어내지 않도록 하기 위함이다.
+        """
+        weights = ", ".join(str(weight) for weight in BM25_WEIGHTS)
+        sql = (
+            f"SELECT chunk_id, bm25(chunks, {weights}) AS rank, metadata "
+            "FROM chunks WHERE chunks MATCH ? ORDER BY rank LIMIT ?"
+        )
+        with self._lock:
+            conn = self._open()
+            if conn is None:
+                return []
+            rows: List[Tuple[str, float, str]] = []
+            seen = set()
+            for identifiers_only in (True, False):
+                match = build_match_query(question, trigram=self.trigram, identifiers_only=identifiers_only)
+                if match is None or len(rows) >= limit:
+                    continue
+                for chunk_id, rank, metadata in conn.execute(sql, (match, limit)):
+                    if chunk_id not in seen and len(rows) < limit:
+                        seen.add(chunk_id)
+                        rows.append((chunk_id, rank, metadata))
+        return [(chunk_id, rank, json.loads(metadata)) for chunk_id, rank, metadata in rows]
+
+
+@process_singleton
+def get_lexical_index() -> ChunkLexicalIndex:
+    return ChunkLexicalIndex()
@@ -0,0 +1,194 @@
+"""
+로컬 벡터 인덱스
+---------------
+rag_outputs/ 청크 임베딩을 디스크의 float32 행렬(np.memmap)과 메타데이터 사이드카로 저장하고,
+NumPy 행렬 곱으로 코사인 유사도 top-k를 계산합니다. 코퍼스가 작을 때 Pinecone 왕복 없이
+네트워크 없이도 검색할 수 있도록 하는 대체 백엔드입니다.
+
+디렉터리 구성 (LOCAL_INDEX_DIR, 기본 .cache/local_index):
+    vectors.f32      L2 정규화된 float32 행렬 (행 = 청크)
+    metadata.jsonl   행 순서와 동일한 청크 메타데이터 (Pinecone 업서트 메타데이터와 같은 형태)
+    manifest.json    모델, 차원, 행 수
+
+`query()`는 Pinecone `Index.query()`와 같은 인자/응답 형태(matches[].id/score/metadata)를 사용하므로
+streamlit_app.run_query에서 그대로 교체할 수 있습니다.
+
+환경 변수:
+    VECTOR_BACKEND   pinecone(기본) | local
+    LOCAL_INDEX_DIR  인덱스 디렉터리
+"""
+
+from __future__ import annotations
+
+import json
+import os
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from rag.common import CACHE_DIR
+
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "pinecone").lower()
+LOCAL_INDEX_DIR = Path(os.getenv("LOCAL_INDEX_DIR", CACHE_DIR / "local_index"))
+
+VECTORS_FILE = "vectors.f32"
+METADATA_FILE = "metadata.jsonl"
+MANIFEST_FILE = "manifest.json"
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class LocalVectorIndex:
+    """memmap float32 행렬 + 메타데이터 사이드카 기반 코사인 검색 인덱스."""
+
+    def __init__(self, directory: Path = LOCAL_INDEX_DIR):
+        self.directory = Path(directory)
+        self.model: Optional[str] = None
+        self.dimension = 0
+        self.ids: List[str] = []
+        self.metadata: List[Dict] = []
+        self.vectors: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def load(self) -> "LocalVectorIndex":
+        manifest_path = self.directory / MANIFEST_FILE
+        if not manifest_path.exists():
+            raise FileNotFoundError(
+                f"로컬 벡터 인덱스를 찾을 수 없습니다: {self.directory} "
+                "(python scripts/build_local_index.py 로 먼저 생성하세요)"
+            )
+        manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+        self.model = manifest.get("model")
+        self.dimension = int(manifest["dimension"])
+        count = int(manifest["count"])
+
+        self.ids = []
+        self.metadata = []
+        with (self.directory / METADATA_FILE).open("r", encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                self.ids.append(record["id"])
+                self.metadata.append(record.get("metadata") or {})
+        if len(self.ids) != count:
+            raise RuntimeError(f"메타데이터 행 수({len(self.ids)})가 manifest({count})와 다릅니다.")
+
+        self.vectors = (
+            np.memmap(self.directory / VECTORS_FILE, dtype=np.float32, mode="r", shape=(count, self.dimension))
+            if count
+            else np.zeros((0, self.dimension), dtype=np.float32)
+        )
+        return self
+
+    @classmethod
+    def write(
+        cls,
+        directory: Path,
+        model: str,
+        dimension: int,
+        records: Sequence[Tuple[str, Dict, Sequence[float]]],
+    ) -> "LocalVectorIndex":
+        """(id, metadata, vector) 목록으로 인덱스 파일을 새로 쓴다. 임시 파일에 쓴 뒤 교체한다."""
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+
+        matrix = np.asarray([vector for _, _, vector in records], dtype=np.float32).reshape(len(records), dimension)
+        matrix = _normalize_rows(matrix).astype(np.float32, copy=False)
+
+        tmp_vectors = directory / (VECTORS_FILE + ".tmp")
+        tmp_metadata = directory / (METADATA_FILE + ".tmp")
+        tmp_manifest = directory / (MANIFEST_FILE + ".tmp")
+        matrix.tofile(tmp_vectors)
+        with tmp_metadata.open("w", encoding="utf-8") as f:
+            for chunk_id, metadata, _ in records:
+                f.write(json.dumps({"id": chunk_id, "metadata": metadata}, ensure_ascii=False) + "\n")
+        tmp_manifest.write_text(
+            json.dumps({"model": model, "dimension": dimension, "count": len(records)}, ensure_ascii=False),
+            encoding="utf-8",
+        )
+        os.replace(tmp_vectors, directory / VECTORS_FILE)
+        os.replace(tmp_metadata, directory / METADATA_FILE)
+        os.replace(tmp_manifest, directory / MANIFEST_FILE)
+        return cls(directory).load()
+
+    def search(self, queries: np.ndarray, top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """(질의 수, 차원) 행렬에 대해 (인덱스, 점수) 배열을 유사도 내림차순으로 돌려준다."""
+        if self.vectors is None:
+            raise RuntimeError("인덱스가 로드되지 않았습니다.")
+        queries = _normalize_rows(np.atleast_2d(np.asarray(queries, dtype=np.float32)))
+        count = len(self.ids)
+        k = min(top_k, count)
+        if k <= 0:
+            empty = np.zeros((len(queries), 0))
+            return empty.astype(np.int64), empty.astype(np.float32)
+
+        scores = queries @ self.vectors.T
+        if k < count:
+            candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        else:
+            candidates = np.tile(np.arange(count), (len(queries), 1))
+        candidate_scores = np.take_along_axis(scores, candidates, axis=1)
+        order = np.argsort(-candidate_scores, axis=1)
+        return np.take_along_axis(candidates, order, axis=1), np.take_along_axis(candidate_scores, order, axis=1)
+
+    def _matches(self, rows: np.ndarray, scores: np.ndarray, include_metadata: bool) -> List[SimpleNamespace]:
+        return [
+            SimpleNamespace(
+                id=self.ids[row],
+                score=float(score),
+                metadata=dict(self.metadata[row]) if include_metadata else None,
+            )
+            for row, score in zip(rows.tolist(), scores.tolist())
+        ]
+
+    def query(
+        self,
+        vector: Sequence[float],
+        top_k: int = 5,
+        include_metadata: bool = True,
+        include_values: bool = False,
+        namespace: Optional[str] = None,
+    ) -> SimpleNamespace:
+        """Pinecone `Index.query()` 호환 인터페이스. namespace/include_values는 무시한다."""
+        rows, scores = self.search(np.asarray([vector], dtype=np.float32), top_k)
+        return SimpleNamespace(matches=self._matches(rows[0], scores[0], include_metadata), namespace=namespace)
+
+    def query_many(
+        self, vectors: Sequence[Sequence[float]], top_k: int = 5, include_metadata: bool = True
+    ) -> List[List[SimpleNamespace]]:
+        """여러 질의를 한 번의 행렬 곱으로 처리한다."""
+        rows, scores = self.search(np.asarray(vectors, dtype=np.float32), top_k)
+        return [self._matches(r, s, include_metadata) for r, s in zip(rows, scores)]
+
+
+def build_local_index(
+    records: Iterable[Tuple[str, str, Dict]],
+    embed_fn: Callable[[List[str]], List[List[float]]],
+    model: str,
+    dimension: int,
+    directory: Path = LOCAL_INDEX_DIR,
+    batch_size: int = 64,
+) -> LocalVectorIndex:
+    """(chunk_id, text, metadata) 스트림을 batch_size 단위로 임베딩해 인덱스를 만든다."""
+    rows: List[Tuple[str, Dict, Sequence[float]]] = []
+    batch: List[Tuple[str, str, Dict]] = []
+
+    def flush() -> None:
+        vectors = embed_fn([text for _, text, _ in batch])
+        rows.extend((chunk_id, metadata, vector) for (chunk_id, _, metadata), vector in zip(batch, vectors))
+        batch.clear()
+
+    for record in records:
+        batch.append(record)
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+    return LocalVectorIndex.write(directory, model, dimension, rows)
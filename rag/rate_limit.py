@@ -0,0 +1,61 @@
+"""
+토큰 버킷 속도 제한기
+-------------------
+배치 질의(초당 벡터 검색 수, 분당 완성 요청 수)처럼 외부 API 호출 속도를 제한할 때 씁니다.
+여러 스레드가 같은 제한기를 공유할 수 있습니다.
+
+    limiter = RateLimiter(rate=600, per=60)   # 분당 600회
+    limiter.acquire()                          # 토큰이 생길 때까지 대기
+    tpm = RateLimiter(rate=1_000_000, per=60)  # 분당 토큰 수처럼 양이 다른 요청은 amount로 차감
+    tpm.acquire(amount=prompt_tokens)
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from typing import Dict, Optional
+
+
+class RateLimiter:
+    """`per`초마다 `rate`만큼 채워지는 토큰 버킷. rate <= 0이면 제한하지 않는다."""
+
+    def __init__(self, rate: float, per: float = 1.0, burst: Optional[float] = None):
+        self.rate = rate
+        self.per = per
+        # 기본 버킷 크기는 1초 분량(최소 1). 분당 제한을 한꺼번에 몰아 쓰지 않도록 한다.
+        self.capacity = max(1.0, burst if burst is not None else rate / per)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self.stats: Dict[str, float] = {"acquired": 0, "waits": 0, "wait_seconds": 0.0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    def acquire(self, amount: float = 1.0) -> float:
+        """amount만큼 토큰을 차감한다. 부족하면 채워질 때까지 잠들고, 기다린 시간(초)을 돌려준다.
+
+        버킷 크기보다 큰 요청은 버킷 크기만큼만 기다린 뒤 통과시킨다 (초과분은 빚으로 남는다).
+        """
+        if not self.enabled:
+            return 0.0
+        per_second = self.rate / self.per
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * per_second)
+                self._updated = now
+                needed = min(amount, self.capacity)
+                if self._tokens >= needed:
+                    self._tokens -= amount
+                    self.stats["acquired"] += amount
+                    if waited:
+                        self.stats["waits"] += 1
+                        self.stats["wait_seconds"] += waited
+                    return waited
+                delay = (needed - self._tokens) / per_second
+            time.sleep(delay)
+            waited += delay
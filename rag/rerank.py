@@ -0,0 +1,123 @@
+"""
+검색 결과 재순위화
+-----------------
+검색 단계에서 top_k의 RERANK_OVERFETCH배 후보를 가져온 뒤, 질문과 더 잘 맞는 순서로 다시 정렬해
+상위 top_k만 프롬프트에 넣습니다. 적은 k로도 정밀도를 유지해 완성 요청의 문맥 토큰을 줄이는 것이 목적입니다.
+
+RERANK_MODE:
+    off            재순위화하지 않음 (기본)
+    lexical        질문/청크의 문자 trigram 겹침(IDF 가중) + 기존 순위를 섞은 점수
+    cross-encoder  sentence-transformers CrossEncoder (RERANK_MODEL, CPU). 미설치/로드 실패 시 lexical로 대체
+
+환경 변수:
+    RERANK_MODE            off | lexical | cross-encoder
+    RERANK_OVERFETCH       후보 배수 (기본 3)
+    RERANK_LEXICAL_WEIGHT  lexical 점수 비중, 나머지는 기존 순위 (기본 0.6)
+    RERANK_MODEL           (기본 cross-encoder/mmarco-mMiniLMv2-L12-H384-v1, 다국어)
+"""
+
+from __future__ import annotations
+
+import math
+import os
+import re
+import threading
+from typing import Dict, List, Optional, Set
+
+try:
+    from sentence_transformers import CrossEncoder
+except ImportError:  # 교차 인코더를 쓰지 않으면 필요 없다.
+    CrossEncoder = None
+
+RERANK_MODE = os.getenv("RERANK_MODE", "off").lower()
+RERANK_OVERFETCH = max(1, int(os.getenv("RERANK_OVERFETCH", "3")))
+RERANK_LEXICAL_WEIGHT = float(os.getenv("RERANK_LEXICAL_WEIGHT", "0.6"))
+RERANK_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1")
+
+_NON_WORD = re.compile(r"[^\w]+")
+
+_cross_encoder = None
+_cross_encoder_lock = threading.Lock()
+_cross_encoder_failed = False
+
+
+def rerank_enabled() -> bool:
+    return RERANK_MODE in {"lexical", "cross-encoder"}
+
+
+def _trigrams(text: str) -> Set[str]:
+    compact = _NON_WORD.sub(" ", text.casefold())
+    grams: Set[str] = set()
+    for word in compact.split():
+        if len(word) <= 3:
+            grams.add(word)
+            continue
+        grams.update(word[start:start + 3] for start in range(len(word) - 2))
+    return grams
+
+
+def _passage(candidate: Dict) -> str:
+    title = str(candidate.get("title") or "")
+    content = str(candidate.get("content") or candidate.get("text") or "")
+    return f"{title}\n{content}"
+
+
+def lexical_scores(question: str, candidates: List[Dict]) -> List[float]:
+    """질문 trigram 중 청크에 나타나는 비율(후보 집합 내 IDF 가중)을 0~1로 계산한다."""
+    query_grams = _trigrams(question)
+    if not query_grams or not candidates:
+        return [0.0] * len(candidates)
+    passages = [_trigrams(_passage(candidate)) for candidate in candidates]
+    total = len(passages)
+    weights = {
+        gram: math.log(1 + total / (1 + sum(1 for grams in passages if gram in grams)))
+        for gram in query_grams
+    }
+    denominator = sum(weights.values()) or 1.0
+    return [sum(weight for gram, weight in weights.items() if gram in grams) / denominator for grams in passages]
+
+
+def _load_cross_encoder():
+    global _cross_encoder, _cross_encoder_failed
+    if CrossEncoder is None or _cross_encoder_failed:
+        return None
+    with _cross_encoder_lock:
+        if _cross_encoder is None and not _cross_encoder_failed:
+            try:
+                _cross_encoder = CrossEncoder(RERANK_MODEL, device="cpu")
+            except Exception as exc:
+                print(f"[재순위화] 교차 인코더 로드 실패, lexical로 대체합니다: {type(exc).__name__} - {exc}")
+                _cross_encoder_failed = True
+        return _cross_encoder
+
+
+def rerank(question: str, candidates: List[Dict], top_k: int, mode: Optional[str] = None) -> List[Dict]:
+    """후보를 재정렬해 상위 top_k개를 돌려준다. 각 항목에 `rerank_score`를 추가한다."""
+    mode = mode or RERANK_MODE
+    if not candidates or mode not in {"lexical", "cross-encoder"}:
+        return candidates[:top_k]
+
+    scores: Optional[List[float]] = None
+    if mode == "cross-encoder":
+        model = _load_cross_encoder()
+        if model is not None:
+            pairs = [(question, _passage(candidate)[:2000]) for candidate in candidates]
+            scores = [float(score) for score in model.predict(pairs)]
+    if scores is None:
+        # 기존 순위(융합/벡터 점수 순)를 사전 확률로 섞어 lexical 점수만으로 뒤집히는 것을 완화한다.
+        count = len(candidates)
+        prior = [1.0 - idx / count for idx in range(count)]
+        overlap = lexical_scores(question, candidates)
+        scores = [
+            RERANK_LEXICAL_WEIGHT * lexical + (1 - RERANK_LEXICAL_WEIGHT) * rank_prior
+            for lexical, rank_prior in zip(overlap, prior)
+        ]
+
+    order = sorted(range(len(candidates)), key=lambda idx: scores[idx], reverse=True)[:top_k]
+    reranked = []
+    for idx in order:
+        candidate = candidates[idx].copy()
+        candidate["rerank_score"] = scores[idx]
+        candidate["retrieval_rank"] = idx + 1
+        reranked.append(candidate)
+    return reranked
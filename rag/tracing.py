@@ -0,0 +1,167 @@
+"""
+RAG 파이프라인 트레이싱
+---------------------
+질의 하나를 `Trace`로, 각 단계(임베딩, 벡터/어휘 검색, 웹 검색 전략별, 재순위화, 프롬프트 생성,
+LLM 완성, 렌더링)를 `span`으로 기록하고, 완료된 트레이스를 JSONL 파일에 한 줄씩 추가합니다.
+
+현재 트레이스는 ContextVar에 담깁니다. 스레드 풀에 작업을 넘길 때는 `submit_in_context()`로
+컨텍스트를 복사해야 워커 스레드의 span이 같은 트레이스에 기록됩니다. 트레이스가 없으면 `span()`은
+아무것도 기록하지 않습니다.
+
+환경 변수:
+    TRACING_ENABLED  JSONL 로그 기록 여부 (기본 true). 꺼도 span은 응답의 timings 계산에 쓰인다.
+    TRACE_LOG_PATH   (기본 .cache/traces.jsonl)
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import Executor, Future
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence
+
+from rag.common import CACHE_DIR
+
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "true").lower() in {"1", "true", "yes"}
+TRACE_LOG_PATH = Path(os.getenv("TRACE_LOG_PATH", CACHE_DIR / "traces.jsonl"))
+
+current_trace: ContextVar[Optional["Trace"]] = ContextVar("current_trace", default=None)
+
+_log_lock = threading.Lock()
+
+
+class Trace:
+    def __init__(self, name: str, **attributes: Any):
+        self.trace_id = uuid.uuid4().hex
+        self.name = name
+        self.attributes: Dict[str, Any] = dict(attributes)
+        self.started_at = time.time()
+        self._started = time.perf_counter()
+        self.duration: Optional[float] = None
+        self.spans: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name: str, **attributes: Any) -> Iterator[Dict[str, Any]]:
+        """with 블록의 소요 시간을 기록한다. 반환된 dict의 "attributes"에 값을 추가할 수 있다."""
+        record: Dict[str, Any] = {
+            "name": name,
+            "start": time.perf_counter() - self._started,
+            "thread": threading.current_thread().name,
+            "attributes": dict(attributes),
+        }
+        started = time.perf_counter()
+        try:
+            yield record
+        except BaseException as exc:
+            record["error"] = f"{type(exc).__name__}: {exc}"
+            raise
+        finally:
+            record["duration"] = time.perf_counter() - started
+            with self._lock:
+                self.spans.append(record)
+
+    def add_span(self, name: str, duration: float, **attributes: Any) -> None:
+        """렌더링처럼 여러 번에 나눠 일어난 작업의 누적 시간을 span 하나로 남긴다."""
+        with self._lock:
+            self.spans.append(
+                {
+                    "name": name,
+                    "start": time.perf_counter() - self._started - duration,
+                    "thread": threading.current_thread().name,
+                    "attributes": dict(attributes),
+                    "duration": duration,
+                }
+            )
+
+    def durations(self) -> Dict[str, float]:
+        """span 이름별 소요 시간 합계 (같은 이름이 여러 번이면 더한다)."""
+        totals: Dict[str, float] = {}
+        with self._lock:
+            for record in self.spans:
+                totals[record["name"]] = totals.get(record["name"], 0.0) + record["duration"]
+        return totals
+
+    def finish(self, **attributes: Any) -> Dict[str, Any]:
+        """트레이스를 닫고 JSONL 로그에 기록한 뒤 직렬화된 dict를 돌려준다. 두 번째 호출부터는 기록하지 않는다."""
+        self.attributes.update(attributes)
+        first_finish = self.duration is None
+        if first_finish:
+            self.duration = time.perf_counter() - self._started
+        payload = self.to_dict()
+        if first_finish and TRACING_ENABLED:
+            write_trace(payload)
+        return payload
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            spans = sorted(self.spans, key=lambda record: record["start"])
+        return {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "started_at": self.started_at,
+            "duration": self.duration,
+            "attributes": self.attributes,
+            "spans": spans,
+        }
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Dict[str, Any]]:
+    """현재 컨텍스트의 트레이스에 span을 기록한다. 트레이스가 없으면 기록하지 않는다."""
+    trace = current_trace.get()
+    if trace is None:
+        yield {"name": name, "attributes": dict(attributes)}
+        return
+    with trace.span(name, **attributes) as record:
+        yield record
+
+
+def submit_in_context(executor: Executor, fn: Callable[..., Any], *args: Any) -> Future:
+    """현재 ContextVar(트레이스 포함)를 복사해 워커 스레드에서 실행한다."""
+    context = copy_context()
+    return executor.submit(context.run, fn, *args)
+
+
+def write_trace(payload: Dict[str, Any], path: Path = TRACE_LOG_PATH) -> None:
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        line = json.dumps(payload, ensure_ascii=False, default=str)
+        with _log_lock, path.open("a", encoding="utf-8") as f:
+            f.write(line + "\n")
+    except OSError as exc:
+        print(f"[트레이스] 로그 기록 실패: {exc}")
+
+
+def percentile(values: Sequence[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def stage_percentiles(traces: Sequence[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """트레이스 목록에서 단계별 (횟수, p50, p95) 밀리초 통계를 계산한다. 전체 시간은 "total"로 포함한다."""
+    samples: Dict[str, List[float]] = {}
+    for payload in traces:
+        per_trace: Dict[str, float] = {}
+        for record in payload.get("spans", []):
+            per_trace[record["name"]] = per_trace.get(record["name"], 0.0) + record["duration"]
+        if payload.get("duration") is not None:
+            per_trace["total"] = payload["duration"]
+        for name, value in per_trace.items():
+            samples.setdefault(name, []).append(value)
+    return [
+        {
+            "stage": name,
+            "count": len(values),
+            "p50_ms": round(percentile(values, 50) * 1000, 1),
+            "p95_ms": round(percentile(values, 95) * 1000, 1),
+        }
+        for name, values in sorted(samples.items(), key=lambda item: -percentile(item[1], 50))
+    ]
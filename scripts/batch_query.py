@@ -0,0 +1,94 @@
+"""
+RAG 일괄 질의 스크립트
+---------------------
+평가용 질문 세트를 Streamlit 없이 rag/engine.py 파이프라인으로 처리해 JSONL로 저장합니다.
+
+실행 예시:
+    python scripts/batch_query.py questions.jsonl -o outputs/answers.jsonl
+    python scripts/batch_query.py questions.txt -o answers.jsonl --concurrency 8 --vector-qps 20
+    python scripts/batch_query.py questions.jsonl -o answers.jsonl --restart   # 처음부터 다시
+
+입력 형식:
+    .jsonl  줄마다 {"id": "q001", "question": "..."}  ("id"가 없으면 질문 해시를 사용)
+    그 외   한 줄에 질문 하나 (빈 줄, # 주석 줄은 무시)
+
+같은 출력 파일로 다시 실행하면 이미 성공한 질문은 건너뛰고 실패/미처리 질문만 이어서 처리합니다.
+평가 결과가 이전 답변에 좌우되지 않도록 기본적으로 답변 캐시를 쓰지 않습니다 (--answer-cache로 사용).
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR))
+
+from rag.engine import (  # noqa: E402
+    BATCH_COMPLETION_RPM,
+    BATCH_CONCURRENCY,
+    BATCH_VECTOR_QPS,
+    EMBED_BATCH_SIZE,
+    RAGEngine,
+    read_questions,
+)
+from rag.rate_limit import RateLimiter  # noqa: E402
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="질문 세트를 일괄 처리해 답변을 JSONL로 저장합니다.")
+    parser.add_argument("input", type=Path, help="질문 파일 (.jsonl 또는 한 줄에 질문 하나)")
+    parser.add_argument("-o", "--output", type=Path, required=True, help="결과 JSONL 경로")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--web", action="store_true", help="웹 검색 결과 포함")
+    parser.add_argument("--web-results", type=int, default=4)
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY, help="동시에 처리할 질문 수")
+    parser.add_argument("--embed-batch-size", type=int, default=EMBED_BATCH_SIZE)
+    parser.add_argument("--vector-qps", type=float, default=BATCH_VECTOR_QPS, help="벡터 검색 초당 상한 (0=무제한)")
+    parser.add_argument(
+        "--completion-rpm", type=float, default=BATCH_COMPLETION_RPM, help="완성 요청 분당 상한 (0=무제한)"
+    )
+    parser.add_argument("--answer-cache", action="store_true", help="의미 기반 답변 캐시 사용")
+    parser.add_argument("--restart", action="store_true", help="기존 출력을 무시하고 처음부터 다시 작성")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    questions = read_questions(args.input)
+    print(f"[배치] 질문 {len(questions)}개 로드: {args.input}")
+
+    vector_limiter = RateLimiter(args.vector_qps, per=1.0)
+    completion_limiter = RateLimiter(args.completion_rpm, per=60.0)
+    engine = RAGEngine.from_env(
+        # 질문마다 벡터/어휘/웹 분기를 하나씩 쓰므로 동시 질문 수의 3배까지 검색 스레드를 둔다.
+        retrieval_workers=max(4, args.concurrency * 3),
+        vector_limiter=vector_limiter if vector_limiter.enabled else None,
+        completion_limiter=completion_limiter if completion_limiter.enabled else None,
+        use_answer_cache=args.answer_cache,
+    )
+    try:
+        summary = engine.run_batch(
+            questions,
+            args.output,
+            top_k=args.top_k,
+            include_web=args.web,
+            web_results_limit=args.web_results,
+            concurrency=args.concurrency,
+            embed_batch_size=args.embed_batch_size,
+            resume=not args.restart,
+        )
+    finally:
+        engine.close()
+
+    summary["vector_rate_wait_seconds"] = round(vector_limiter.stats["wait_seconds"], 2)
+    summary["completion_rate_wait_seconds"] = round(completion_limiter.stats["wait_seconds"], 2)
+    print(json.dumps(summary, ensure_ascii=False))
+    if summary["failed"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+특허 API 응답 벤치마크
+---------------------
+FastAPI TestClient로 주요 엔드포인트를 반복 호출해 응답 크기(무압축/gzip/br)와
+지연 시간(p50/p95)을 출력합니다. 네트워크를 거치지 않으므로 순수 서버 처리 비용을 비교할 때 사용합니다.
+
+실행 예시:
+    python scripts/benchmark_api.py --iterations 200
+    GST_PATENTS_DB=/tmp/gst_patents.db python scripts/benchmark_api.py
+"""
+
+from __future__ import annotations
+
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR))
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from api.main import app  # noqa: E402
+
+
+def percentile(values: List[float], pct: float) -> float:
+    # rag.tracing.percentile과 같은 최근접 순위 방식. API 도구가 RAG 패키지에 의존하지 않도록 따로 둔다.
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def measure(client: TestClient, path: str, params: Dict, iterations: int, encoding: str) -> Tuple[float, float, int]:
+    headers = {"Accept-Encoding": encoding}
+    timings: List[float] = []
+    size = 0
+    for _ in range(iterations):
+        started = time.perf_counter()
+        response = client.get(path, params=params, headers=headers)
+        timings.append((time.perf_counter() - started) * 1000)
+        response.raise_for_status()
+        # 압축 응답은 httpx가 자동으로 풀기 때문에 실제 전송 바이트 수를 사용한다.
+        size = response.num_bytes_downloaded
+    return statistics.median(timings), percentile(timings, 95), size
+
+
+def main():
+    parser = argparse.ArgumentParser(description="GST 특허 API 응답 크기/지연 벤치마크")
+    parser.add_argument("--iterations", type=int, default=100)
+    parser.add_argument("--query", default="스크러버")
+    args = parser.parse_args()
+
+    with TestClient(app) as client:
+        ids = [item["id"] for item in client.get("/patents", params={"limit": 50, "fields": "id"}).json()]
+        cases = [
+            ("/patents?limit=200", "/patents", {"limit": 200}),
+            (f"/patents?q={args.query}", "/patents", {"q": args.query, "limit": 50}),
+            ("/patents/batch (50)", "/patents/batch", {"ids": ",".join(ids)}),
+            ("/stats/facets", "/stats/facets", {}),
+        ]
+
+        print(f"{'endpoint':<28} {'encoding':<9} {'bytes':>9} {'p50 ms':>8} {'p95 ms':>8}")
+        for label, path, params in cases:
+            for encoding in ("identity", "gzip", "br"):
+                p50, p95, size = measure(client, path, params, args.iterations, encoding)
+                print(f"{label:<28} {encoding:<9} {size:>9} {p50:>8.2f} {p95:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+스트리밍 답변 렌더링 벤치마크
+---------------------------
+500/1500/4000 토큰 길이의 합성 답변을 토큰 단위로 흘려 보내며
+기존 방식(매 토큰마다 전체 텍스트 sanitize_text 후 전송)과
+IncrementalAnswerRenderer + 갱신 간격 제한(StreamingRender와 동일한 규칙)의
+답변당 CPU 시간과 placeholder로 보내는 HTML 총 바이트 수를 비교합니다.
+토큰 도착 시각은 --tokens-per-second로 가정한 가상 시계를 사용합니다.
+
+실행 예시:
+    python scripts/benchmark_render.py
+    python scripts/benchmark_render.py --tokens 500 1500 4000 --repeat 5
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Callable, List, Tuple
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR))
+
+from rag.answer_render import IncrementalAnswerRenderer, sanitize_text  # noqa: E402
+
+WORDS = ["스크러버", "배기가스", "플라즈마", "반응챔버", "냉각수", "칠러", "[특허1]", "온도", "제어부", "유량"]
+
+
+def synthetic_tokens(count: int, seed: int = 0) -> List[str]:
+    """문단/목록/빈 줄이 섞인 답변을 공백 포함 토큰 목록으로 만든다."""
+    rng = random.Random(seed)
+    tokens: List[str] = []
+    while len(tokens) < count:
+        if rng.random() < 0.4:
+            for _ in range(rng.randint(2, 5)):
+                tokens.append("- ")
+                tokens.extend(f"{rng.choice(WORDS)} " for _ in range(rng.randint(4, 12)))
+                tokens.append("\n")
+        else:
+            tokens.extend(f"{rng.choice(WORDS)} " for _ in range(rng.randint(15, 40)))
+            tokens.append("\n")
+        tokens.append("\n")
+    return tokens[:count]
+
+
+def full_rerender(tokens: List[str]) -> Tuple[str, int]:
+    buffer = ""
+    sent = 0
+    html = ""
+    for token in tokens:
+        buffer += token
+        html = sanitize_text(buffer)
+        sent += len(html.encode("utf-8"))
+    return html, sent
+
+
+def incremental(tokens: List[str], tokens_per_second: float, interval: float) -> Tuple[str, int]:
+    renderer = IncrementalAnswerRenderer()
+    sent = 0
+    html = ""
+    last_flush = None
+    for idx, token in enumerate(tokens):
+        html = renderer.feed(token)
+        arrived = idx / tokens_per_second
+        if last_flush is not None and arrived - last_flush < interval:
+            continue
+        last_flush = arrived
+        sent += len(html.encode("utf-8"))
+    # 마지막 상태는 항상 한 번 더 전송된다 (StreamingRender.finish).
+    sent += len(html.encode("utf-8"))
+    return html, sent
+
+
+def measure(fn: Callable[[List[str]], Tuple[str, int]], tokens: List[str], repeat: int) -> Tuple[float, int, str]:
+    timings = []
+    html, sent = "", 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        html, sent = fn(tokens)
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings), sent, html
+
+
+def main():
+    parser = argparse.ArgumentParser(description="스트리밍 답변 렌더링 비용 벤치마크")
+    parser.add_argument("--tokens", type=int, nargs="+", default=[500, 1500, 4000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--tokens-per-second", type=float, default=60.0)
+    parser.add_argument("--interval", type=float, default=0.05, help="STREAM_RENDER_INTERVAL과 같은 의미")
+    args = parser.parse_args()
+
+    print(f"{'tokens':>7} {'renderer':<12} {'ms/answer':>10} {'html bytes sent':>16}")
+    for count in args.tokens:
+        tokens = synthetic_tokens(count)
+        full_ms, full_sent, full_html = measure(full_rerender, tokens, args.repeat)
+        inc_ms, inc_sent, inc_html = measure(
+            lambda items: incremental(items, args.tokens_per_second, args.interval), tokens, args.repeat
+        )
+        if full_html != inc_html:
+            raise SystemExit(f"렌더링 결과 불일치 ({count} tokens)")
+        print(f"{count:>7} {'full':<12} {full_ms:>10.2f} {full_sent:>16,}")
+        print(f"{count:>7} {'incremental':<12} {inc_ms:>10.2f} {inc_sent:>16,}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+로컬 벡터 인덱스 생성 스크립트
+-----------------------------
+`rag_outputs/`의 JSONL 청크를 임베딩해 rag/local_index.py 형식(memmap float32 + 메타데이터 사이드카)으로
+저장합니다. VECTOR_BACKEND=local 로 설정하면 Streamlit 앱이 Pinecone 대신 이 인덱스를 사용합니다.
+
+실행 예시:
+    python scripts/build_local_index.py
+    LOCAL_INDEX_DIR=/tmp/gst_index python scripts/build_local_index.py
+
+청크 임베딩은 쿼리 캐시와 분리된 청크 임베딩 캐시(.cache/chunk_embeddings.sqlite3)를 거치므로
+내용이 바뀌지 않은 청크는 재생성 시 OpenAI API를 다시 호출하지 않습니다.
+"""
+
+from __future__ import annotations
+
+import sys
+import time
+from pathlib import Path
+from typing import List, Tuple
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR))
+
+from openai import OpenAI  # noqa: E402
+
+from rag.answer_cache import bump_corpus_version  # noqa: E402
+from rag.embedding_cache import get_chunk_embedding_cache  # noqa: E402
+from rag.lexical_index import invalidate_source_signature  # noqa: E402
+from rag.local_index import LOCAL_INDEX_DIR, build_local_index  # noqa: E402
+from scripts.pinecone_ingest import (  # noqa: E402
+    EMBEDDING_DIMENSION,
+    EMBEDDING_MODEL,
+    RAG_OUTPUT_DIR,
+    load_jsonl_chunks,
+)
+
+
+def sync_local_index(directory: Path = LOCAL_INDEX_DIR) -> Tuple[int, int]:
+    """rag_outputs 전체로 로컬 인덱스를 다시 만든다. (벡터 개수, 문서 개수) 반환."""
+    if not RAG_OUTPUT_DIR.exists():
+        raise FileNotFoundError(f"RAG 출력 디렉터리를 찾을 수 없습니다: {RAG_OUTPUT_DIR}")
+
+    client = OpenAI()
+    cache = get_chunk_embedding_cache()
+
+    def embed(texts: List[str]) -> List[List[float]]:
+        def call(batch: List[str]) -> List[List[float]]:
+            response = client.embeddings.create(model=EMBEDDING_MODEL, input=batch)
+            return [item.embedding for item in response.data]
+
+        if cache is None:
+            return call(texts)
+        return cache.get_or_embed(EMBEDDING_MODEL, EMBEDDING_DIMENSION, texts, call)
+
+    records = (
+        (chunk.chunk_id, chunk.text, chunk.metadata) for chunk in load_jsonl_chunks(RAG_OUTPUT_DIR)
+    )
+    index = build_local_index(records, embed, EMBEDDING_MODEL, EMBEDDING_DIMENSION, directory)
+    bump_corpus_version()
+    invalidate_source_signature()
+    doc_ids = {str(meta.get("doc_id")) for meta in index.metadata if meta.get("doc_id")}
+    return len(index), len(doc_ids)
+
+
+def main():
+    started = time.perf_counter()
+    vectors, docs = sync_local_index()
+    elapsed = time.perf_counter() - started
+    print(f"✅ 로컬 벡터 인덱스 생성 완료 - {vectors} 벡터 (문서 {docs}건), {elapsed:.1f}초 → {LOCAL_INDEX_DIR}")
+
+
+if __name__ == "__main__":
+    main()
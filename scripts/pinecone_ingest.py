@@ -7,15 +7,23 @@ Pinecone 업서트 스크립트
     python scripts/pinecone_ingest.py
 
 환경 변수는 프로젝트 루트의 .env 파일(OpenAI/Pinecone 설정)을 사용합니다.
+임베딩과 업서트는 파이프라인으로 동시에 진행되며(INGEST_* 설정), 임베딩 요청은
+OPENAI_EMBED_RPM/OPENAI_EMBED_TPM 상한을 지킵니다. 진행 중 처리량(청크/s, 토큰/s)을 출력합니다.
 """
 
 from __future__ import annotations
 
+import argparse
 import json
 import os
+import sys
+import threading
+import time
 from dataclasses import dataclass
+from itertools import chain
 from pathlib import Path
-from typing import Dict, Iterable, List, Optional, Tuple, Union
+from queue import Full, Queue
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
 
 from dotenv import load_dotenv
 from openai import OpenAI
@@ -27,6 +35,15 @@ load_dotenv()
 ROOT_DIR = Path(__file__).resolve().parent.parent
 RAG_OUTPUT_DIR = ROOT_DIR / "rag_outputs"
 
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+from rag.answer_cache import bump_corpus_version  # noqa: E402
+from rag.context_packer import make_token_counter  # noqa: E402
+from rag.ingest_manifest import IngestManifest, content_hash  # noqa: E402
+from rag.lexical_index import invalidate_source_signature  # noqa: E402
+from rag.rate_limit import RateLimiter  # noqa: E402
+
 PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
 PINECONE_ENVIRONMENT = os.getenv("PINECONE_ENVIRONMENT", "us-east-1")
 PINECONE_INDEX_NAME = os.getenv("PINECONE_INDEX", "gstllm")
@@ -53,6 +70,18 @@ else:
 
 AUTO_RECREATE_INDEX = os.getenv("PINECONE_AUTO_RECREATE", "true").lower() in {"1", "true", "yes"}
 
+# 파이프라인 업서트: 임베딩 요청 N개와 업서트 M개를 동시에 실행하고, 단계 사이를 크기 제한 큐로 연결한다.
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "64"))
+INGEST_EMBED_WORKERS = int(os.getenv("INGEST_EMBED_WORKERS", "4"))
+INGEST_UPSERT_WORKERS = int(os.getenv("INGEST_UPSERT_WORKERS", "2"))
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "8"))
+INGEST_PROGRESS_INTERVAL = float(os.getenv("INGEST_PROGRESS_INTERVAL", "5"))
+# OpenAI 임베딩 분당 요청 수 / 분당 토큰 수 상한 (0이면 제한하지 않음)
+OPENAI_EMBED_RPM = float(os.getenv("OPENAI_EMBED_RPM", "3000"))
+OPENAI_EMBED_TPM = float(os.getenv("OPENAI_EMBED_TPM", "1000000"))
+# Pinecone delete 요청 한 번에 보낼 수 있는 최대 ID 수
+PINECONE_DELETE_BATCH = 1000
+
 
 @dataclass
 class ChunkRecord:
@@ -154,8 +183,149 @@ def batch_iterable(iterable: Iterable[ChunkRecord], batch_size: int = 64) -> Ite
         yield batch
 
 
-def upsert_chunks_to_pinecone(chunks: Iterable[ChunkRecord]) -> Tuple[int, int]:
-    """청크를 임베딩 후 Pinecone에 업서트한다. (업서트 개수, 청크 개수) 반환."""
+class IngestProgress:
+    """임베딩/업서트 처리량 집계. INGEST_PROGRESS_INTERVAL마다 청크/s, 토큰/s를 출력한다."""
+
+    def __init__(self, interval: float = INGEST_PROGRESS_INTERVAL):
+        self.interval = interval
+        self.started = time.perf_counter()
+        self._last_report = self.started
+        self._lock = threading.Lock()
+        self.chunks_embedded = 0
+        self.chunks_upserted = 0
+        self.tokens = 0
+
+    def embedded(self, chunks: int, tokens: int) -> None:
+        with self._lock:
+            self.chunks_embedded += chunks
+            self.tokens += tokens
+
+    def upserted(self, chunks: int) -> None:
+        with self._lock:
+            self.chunks_upserted += chunks
+            now = time.perf_counter()
+            if now - self._last_report < self.interval:
+                return
+            self._last_report = now
+        print(self.summary())
+
+    def summary(self, final: bool = False) -> str:
+        elapsed = max(time.perf_counter() - self.started, 1e-9)
+        label = "완료" if final else "진행"
+        return (
+            f"[업서트 {label}] {self.chunks_upserted:,} 청크 업서트 ({self.chunks_embedded:,} 임베딩) · "
+            f"{elapsed:.1f}초 · {self.chunks_upserted / elapsed:,.1f} 청크/s · {self.tokens / elapsed:,.0f} 토큰/s"
+        )
+
+
+_PIPELINE_END = object()
+
+
+def run_ingest_pipeline(
+    batches: Iterable[List[ChunkRecord]],
+    embed_batch: Callable[[List[ChunkRecord]], Tuple[List[List[float]], int]],
+    upsert_batch: Callable[[List[ChunkRecord], List[List[float]]], None],
+    embed_workers: int = INGEST_EMBED_WORKERS,
+    upsert_workers: int = INGEST_UPSERT_WORKERS,
+    queue_size: int = INGEST_QUEUE_SIZE,
+    progress: Optional[IngestProgress] = None,
+) -> IngestProgress:
+    """배치 읽기 → 임베딩(embed_workers개) → 업서트(upsert_workers개)를 동시에 실행한다.
+
+    단계 사이의 큐는 queue_size개로 제한되어, 업서트가 밀리면 임베딩이, 임베딩이 밀리면 배치 읽기가 멈춘다.
+    embed_batch는 (벡터 목록, 사용 토큰 수)를 돌려준다. 한 작업이라도 실패하면 남은 배치를 버리고
+    첫 번째 예외를 다시 발생시킨다.
+    """
+    progress = progress or IngestProgress()
+    embed_queue: Queue = Queue(maxsize=max(1, queue_size))
+    upsert_queue: Queue = Queue(maxsize=max(1, queue_size))
+    failed = threading.Event()
+    errors: List[BaseException] = []
+
+    def put(queue: Queue, item) -> bool:
+        while not failed.is_set():
+            try:
+                queue.put(item, timeout=0.2)
+                return True
+            except Full:
+                continue
+        return False
+
+    def fail(exc: BaseException) -> None:
+        errors.append(exc)
+        failed.set()
+
+    def embed_worker() -> None:
+        while True:
+            batch = embed_queue.get()
+            if batch is _PIPELINE_END:
+                return
+            if failed.is_set():
+                continue
+            try:
+                vectors, tokens = embed_batch(batch)
+                progress.embedded(len(batch), tokens)
+                put(upsert_queue, (batch, vectors))
+            except Exception as exc:
+                fail(exc)
+
+    def upsert_worker() -> None:
+        while True:
+            item = upsert_queue.get()
+            if item is _PIPELINE_END:
+                return
+            if failed.is_set():
+                continue
+            batch, vectors = item
+            try:
+                upsert_batch(batch, vectors)
+                progress.upserted(len(batch))
+            except Exception as exc:
+                fail(exc)
+
+    embedders = [
+        threading.Thread(target=embed_worker, name=f"ingest-embed-{idx}", daemon=True)
+        for idx in range(max(1, embed_workers))
+    ]
+    upserters = [
+        threading.Thread(target=upsert_worker, name=f"ingest-upsert-{idx}", daemon=True)
+        for idx in range(max(1, upsert_workers))
+    ]
+    for thread in embedders + upserters:
+        thread.start()
+
+    try:
+        for batch in batches:
+            if not put(embed_queue, batch):
+                break
+    except Exception as exc:
+        fail(exc)
+    finally:
+        # 종료 신호는 앞 단계가 모두 끝난 뒤 보낸다. 작업자는 실패 후에도 큐를 비우므로 막히지 않는다.
+        for _ in embedders:
+            embed_queue.put(_PIPELINE_END)
+        for thread in embedders:
+            thread.join()
+        for _ in upserters:
+            upsert_queue.put(_PIPELINE_END)
+        for thread in upserters:
+            thread.join()
+
+    if errors:
+        raise errors[0]
+    return progress
+
+
+def upsert_chunks_to_pinecone(
+    chunks: Iterable[ChunkRecord],
+    on_batch_upserted: Optional[Callable[[List[ChunkRecord]], None]] = None,
+) -> Tuple[int, int, int]:
+    """청크를 임베딩 후 Pinecone에 업서트한다. (업서트 개수, 청크 개수, 문서 개수) 반환.
+
+    임베딩 요청은 OPENAI_EMBED_RPM/OPENAI_EMBED_TPM 속도 제한을 거쳐 INGEST_EMBED_WORKERS개까지,
+    업서트는 INGEST_UPSERT_WORKERS개까지 동시에 실행한다. on_batch_upserted는 업서트가 끝난 배치마다
+    (업서트 작업자 스레드에서) 호출된다.
+    """
     if not PINECONE_API_KEY:
         raise RuntimeError("PINECONE_API_KEY가 설정되어 있지 않습니다.")
 
@@ -164,49 +334,161 @@ def upsert_chunks_to_pinecone(chunks: Iterable[ChunkRecord]) -> Tuple[int, int]:
     index = pc.Index(PINECONE_INDEX_NAME)
 
     client = OpenAI()
+    rpm_limiter = RateLimiter(OPENAI_EMBED_RPM, per=60.0)
+    tpm_limiter = RateLimiter(OPENAI_EMBED_TPM, per=60.0)
+    count_tokens = make_token_counter(EMBEDDING_MODEL)
 
-    total_upserts = 0
-    total_chunks = 0
     doc_ids = set()
+    doc_ids_lock = threading.Lock()
 
-    for batch in batch_iterable(chunks, batch_size=64):
+    def embed_batch(batch: List[ChunkRecord]) -> Tuple[List[List[float]], int]:
         inputs = [record.text for record in batch]
+        estimated_tokens = sum(count_tokens(text) for text in inputs)
+        rpm_limiter.acquire()
+        tpm_limiter.acquire(estimated_tokens)
         embeddings_response = client.embeddings.create(
             model=EMBEDDING_MODEL,
             input=inputs,
         )
+        usage = getattr(embeddings_response, "usage", None)
+        tokens = getattr(usage, "total_tokens", None) or estimated_tokens
+        return [embed.embedding for embed in embeddings_response.data], tokens
 
+    def upsert_batch(batch: List[ChunkRecord], embeddings: List[List[float]]) -> None:
         vectors = []
-        for record, embed in zip(batch, embeddings_response.data):
+        for record, embedding in zip(batch, embeddings):
             doc_id = record.metadata.get("doc_id")
             if doc_id:
-                doc_ids.add(str(doc_id))
+                with doc_ids_lock:
+                    doc_ids.add(str(doc_id))
             vectors.append(
                 {
                     "id": _to_pinecone_id(record.chunk_id),
-                    "values": embed.embedding,
+                    "values": embedding,
                     "metadata": record.metadata,
                 }
             )
-
         index.upsert(vectors=vectors, namespace=PINECONE_NAMESPACE)
-        total_upserts += len(vectors)
-        total_chunks += len(batch)
+        if on_batch_upserted is not None:
+            on_batch_upserted(batch)
+
+    progress = run_ingest_pipeline(batch_iterable(chunks, batch_size=INGEST_BATCH_SIZE), embed_batch, upsert_batch)
+    print(progress.summary(final=True))
+    if rpm_limiter.stats["waits"] or tpm_limiter.stats["waits"]:
+        print(
+            f"[업서트] 속도 제한 대기 · RPM {rpm_limiter.stats['wait_seconds']:.1f}초 · "
+            f"TPM {tpm_limiter.stats['wait_seconds']:.1f}초"
+        )
+    return progress.chunks_upserted, progress.chunks_embedded, len(doc_ids)
+
 
-    return total_upserts, total_chunks, len(doc_ids)
+def manifest_target() -> str:
+    return f"{PINECONE_INDEX_NAME}/{PINECONE_NAMESPACE}"
 
 
-def sync_rag_outputs() -> Tuple[int, int]:
-    """rag_outputs 폴더 전체를 Pinecone과 동기화한다."""
+def delete_from_pinecone(vector_ids: List[str]) -> None:
+    pc = Pinecone(api_key=PINECONE_API_KEY)
+    index = pc.Index(PINECONE_INDEX_NAME)
+    for start in range(0, len(vector_ids), PINECONE_DELETE_BATCH):
+        index.delete(ids=vector_ids[start:start + PINECONE_DELETE_BATCH], namespace=PINECONE_NAMESPACE)
+
+
+def sync_rag_outputs(full: bool = False) -> Tuple[int, int, int]:
+    """rag_outputs 폴더 전체를 Pinecone과 동기화한다. (업서트 개수, 전체 청크 개수, 문서 개수) 반환.
+
+    수집 매니페스트와 비교해 새로 생기거나 내용/메타데이터/임베딩 설정이 바뀐 청크만 임베딩·업서트하고,
+    rag_outputs에서 사라진 청크는 네임스페이스에서 삭제한다. 바뀐 것이 없으면 API를 호출하지 않는다.
+    full=True이면 매니페스트와 비교하지 않고 모든 청크를 다시 업서트한다 (기록은 덮어쓰고, 사라진 청크는 삭제).
+    """
     if not RAG_OUTPUT_DIR.exists():
         raise FileNotFoundError(f"RAG 출력 디렉터리를 찾을 수 없습니다: {RAG_OUTPUT_DIR}")
 
-    chunks = load_jsonl_chunks(RAG_OUTPUT_DIR)
-    return upsert_chunks_to_pinecone(chunks)
+    manifest = IngestManifest()
+    target = manifest_target()
+    # full이어도 기존 기록은 먼저 읽어 둔다. 사라진 청크(삭제 대상)는 이 기록으로만 알 수 있다.
+    known = manifest.entries(target)
+
+    present: Set[str] = set()
+    doc_ids: Set[str] = set()
+    hashes: Dict[str, str] = {}
+    recorded = 0
+    recorded_lock = threading.Lock()
+
+    def changed_chunks() -> Iterator[ChunkRecord]:
+        for chunk in load_jsonl_chunks(RAG_OUTPUT_DIR):
+            present.add(chunk.chunk_id)
+            if chunk.metadata.get("doc_id"):
+                doc_ids.add(str(chunk.metadata["doc_id"]))
+            digest = content_hash(chunk.text, chunk.metadata)
+            entry = known.get(chunk.chunk_id)
+            if (
+                not full
+                and entry is not None
+                and entry.sha256 == digest
+                and entry.model == EMBEDDING_MODEL
+                and entry.dimension == EMBEDDING_DIMENSION
+            ):
+                continue
+            hashes[chunk.chunk_id] = digest
+            yield chunk
+
+    def record_batch(batch: List[ChunkRecord]) -> None:
+        nonlocal recorded
+        manifest.record(
+            target,
+            [
+                (
+                    chunk.chunk_id,
+                    _to_pinecone_id(chunk.chunk_id),
+                    str(chunk.metadata.get("doc_id") or "") or None,
+                    hashes[chunk.chunk_id],
+                    EMBEDDING_MODEL,
+                    EMBEDDING_DIMENSION,
+                )
+                for chunk in batch
+            ],
+        )
+        with recorded_lock:
+            recorded += len(batch)
+
+    upserts = 0
+    stale: List[str] = []
+    try:
+        # 바뀐 청크가 하나도 없으면 Pinecone/OpenAI 클라이언트를 만들지 않는다.
+        pending = changed_chunks()
+        first = next(pending, None)
+        if first is not None:
+            upserts, _, _ = upsert_chunks_to_pinecone(chain([first], pending), on_batch_upserted=record_batch)
+
+        # 업서트가 끝까지 성공해 present가 완전할 때만 삭제 대상을 정한다.
+        stale = sorted(chunk_id for chunk_id in known if chunk_id not in present)
+        if stale and not present:
+            # 경로 설정 오류 등으로 청크를 하나도 읽지 못했을 때 네임스페이스 전체를 지우지 않는다.
+            print(f"⚠️  rag_outputs에서 청크를 찾지 못해 매니페스트의 {len(stale)}개 청크 삭제를 건너뜁니다.")
+            stale = []
+        if stale:
+            delete_from_pinecone([known[chunk_id].vector_id for chunk_id in stale])
+            manifest.remove(target, stale)
+    finally:
+        manifest.close()
+        # 같은 프로세스(Streamlit 사이드바 동기화)의 다음 질의가 어휘 인덱스를 바로 다시 확인하게 한다.
+        invalidate_source_signature()
+        if recorded or stale:
+            # 중간에 실패했더라도 일부 배치가 반영됐다면 코퍼스가 바뀐 것이므로 기존 답변 캐시를 무효화한다.
+            bump_corpus_version()
+
+    print(
+        f"[증분 동기화] 전체 {len(present):,} 청크 · 업서트 {upserts:,} · "
+        f"변경 없음 {len(present) - len(hashes):,} · 삭제 {len(stale):,}"
+    )
+    return upserts, len(present), len(doc_ids)
 
 
 def main():
-    upserts, chunks, docs = sync_rag_outputs()
+    parser = argparse.ArgumentParser(description="rag_outputs 청크를 Pinecone에 동기화합니다.")
+    parser.add_argument("--full", action="store_true", help="수집 매니페스트를 무시하고 모든 청크를 다시 업서트")
+    args = parser.parse_args()
+    upserts, chunks, docs = sync_rag_outputs(full=args.full)
     print(f"✅ Pinecone 업서트 완료 - 총 {upserts} 벡터 (청크 {chunks}개, 문서 {docs}건)")
 
 
@@ -15,338 +15,32 @@ from html import escape
 from pathlib import Path
 from typing import Dict, List, Tuple
 import time
-import re
 
 import streamlit as st
 from dotenv import load_dotenv
-from openai import OpenAI
-from pinecone import Pinecone
 import requests
 
-from scripts.pinecone_ingest import (
-    PINECONE_API_KEY,
-    PINECONE_INDEX_NAME,
-    PINECONE_NAMESPACE,
-    EMBEDDING_MODEL,
-    sync_rag_outputs,
-)
+from scripts.pinecone_ingest import EMBEDDING_MODEL, sync_rag_outputs
+from rag.answer_render import IncrementalAnswerRenderer, sanitize_text
+from rag.answer_cache import get_answer_cache
+from rag.embedding_cache import get_embedding_cache
+from rag.engine import CHAT_MODEL, WEB_SEARCH_ENABLED, RAGEngine, describe_scores
+from rag.local_index import VECTOR_BACKEND
+from rag.tracing import TRACE_LOG_PATH, Trace, stage_percentiles
 
 load_dotenv()
 
-CHAT_MODEL = os.getenv("OPENAI_CHAT_MODEL", "gpt-4o-mini")
 PATENT_DOC_BASE_URL = os.getenv("PATENT_DOC_BASE_URL", "http://localhost:8080/data/patents")
-WEB_SEARCH_ENABLED = os.getenv("WEB_SEARCH_ENABLED", "true").lower() == "true"
+# 항상 그리는 최근 메시지 수 / 세션에 보관하는 최대 메시지 수
+CHAT_VISIBLE_MESSAGES = int(os.getenv("CHAT_VISIBLE_MESSAGES", "12"))
+CHAT_HISTORY_LIMIT = int(os.getenv("CHAT_HISTORY_LIMIT", "200"))
+# 스트리밍 답변 placeholder 갱신 최소 간격(초)
+STREAM_RENDER_INTERVAL = float(os.getenv("STREAM_RENDER_INTERVAL", "0.05"))
 
 @st.cache_resource(show_spinner=False)
-def init_clients():
-    if not PINECONE_API_KEY:
-        raise RuntimeError("Pinecone API Key가 설정되어 있지 않습니다 (.env 파일을 확인하세요).")
-    pinecone_client = Pinecone(api_key=PINECONE_API_KEY)
-    pinecone_index = pinecone_client.Index(PINECONE_INDEX_NAME)
-    openai_client = OpenAI()
-    return pinecone_index, openai_client
-
-
-def embed_text(client: OpenAI, text: str) -> List[float]:
-    response = client.embeddings.create(
-        model=EMBEDDING_MODEL,
-        input=[text],
-    )
-    return response.data[0].embedding
-
-
-def build_prompt(question: str, contexts: List[Dict], web_results: List[Dict]) -> str:
-    context_blocks = []
-    for ctx in contexts:
-        content = ctx.get("content") or ctx.get("text") or ""
-        title = ctx.get("title") or ctx.get("doc_id") or "미상 특허"
-        page = ctx.get("page")
-        tag = ctx.get("tag", "특허")
-        header = f"[{tag}] 문서: {title}"
-        if page is not None:
-            header += f", 페이지 {page}"
-        block = f"{header}\n점수: {ctx.get('score', 0):.3f}\n내용:\n{content}"
-        context_blocks.append(block.strip())
-
-    combined_context = "\n\n".join(context_blocks)
-
-    web_block = ""
-    if web_results:
-        entries = []
-        for item in web_results:
-            title = item.get("title") or "웹 검색 결과"
-            snippet = item.get("snippet") or ""
-            link = item.get("link") or ""
-            tag = item.get("tag", "웹")
-            entry = f"[{tag}] 제목: {title}\n요약: {snippet}\n링크: {link}"
-            entries.append(entry.strip())
-        web_block = "\n\n".join(entries)
-
-    system_prompt = (
-        "당신은 GST 특허 데이터에 기반한 전문 분석 어시스턴트입니다. "
-        "주어진 문맥만을 사용해 질문에 답변하고, 확신이 없을 경우 사실대로 부족한 점을 말씀하세요. "
-        "항상 한국어로 응답하세요."
-    )
-
-    prompt = (
-        f"{system_prompt}\n\n"
-        f"[특허 문맥]\n{combined_context if combined_context else '관련 특허 문맥이 제공되지 않았습니다.'}\n\n"
-    )
-
-    if web_block:
-        prompt += f"[웹 검색 결과]\n{web_block}\n\n"
-
-    prompt += (
-        f"[사용자 질문]\n{question}\n\n"
-        "응답 시에는 다음을 포함하세요:\n"
-        "- 핵심 요약\n"
-        "- 상세 설명\n"
-        "- 사용한 모든 근거에 대해 해당 태그를 대괄호로 인용 (예: [특허1], [웹2])\n"
-        "- 답변 마지막에 '출처:' 섹션을 만들고 사용한 태그를 제목과 함께 bullet 리스트로 정리\n"
-        "- 추론 근거가 부족한 경우, 추가 정보 필요성을 명시"
-    )
-    return prompt
-
-
-def web_search(query: str, max_results: int = 4) -> List[Dict]:
-    """
-    특허 전문 웹 검색 기능 - 한국/일본/미국/기타 특허청 최적화
-    
-    검색 소스:
-    - 한국특허청 (KIPRIS): patents.go.kr
-    - 일본특허청 (J-PlatPat): j-platpat.inpit.go.jp
-    - 미국특허청 (USPTO): patents.google.com, uspto.gov
-    - 유럽특허청 (EPO): espacenet.com
-    - 일반 웹 검색 (DuckDuckGo)
-    
-    주의: 웹 검색은 특허 검색을 보완하는 용도로만 사용됩니다.
-    실제 특허 정보는 Pinecone 벡터 DB에서 가져옵니다.
-    """
-    if not WEB_SEARCH_ENABLED:
-        return []
-    
-    all_results = []
-    
-    try:
-        from duckduckgo_search import DDGS
-        
-        # 특허 번호 패턴 감지
-        patent_number_patterns = {
-            'kr': re.compile(r'(KR|10-?\d{7})', re.IGNORECASE),
-            'jp': re.compile(r'(JP|特許|特開|特公)\s*[\d-]+', re.IGNORECASE),
-            'us': re.compile(r'(US|USD?)\s*[\d,]+', re.IGNORECASE),
-        }
-        
-        detected_regions = []
-        for region, pattern in patent_number_patterns.items():
-            if pattern.search(query):
-                detected_regions.append(region)
-        
-        # 검색 전략 수립
-        search_strategies = []
-        
-        # 1. 한국 특허 검색 전략
-        if not detected_regions or 'kr' in detected_regions or any(
-            keyword in query.lower() for keyword in ['스크러버', '칠러', '플라즈마', '반도체']
-        ):
-            search_strategies.append({
-                'query': f'{query} site:patents.go.kr OR site:kipris.or.kr',
-                'region': '🇰🇷 한국특허청',
-                'priority': 10
-            })
-            search_strategies.append({
-                'query': f'{query} 특허 한국',
-                'region': '🇰🇷 한국',
-                'priority': 8
-            })
-        
-        # 2. 일본 특허 검색 전략
-        if 'jp' in detected_regions or any(
-            keyword in query for keyword in ['日本', 'スクラバー', 'チラー']
-        ):
-            search_strategies.append({
-                'query': f'{query} site:j-platpat.inpit.go.jp',
-                'region': '🇯🇵 일본특허청',
-                'priority': 10
-            })
-            search_strategies.append({
-                'query': f'{query} 特許 日本',
-                'region': '🇯🇵 일본',
-                'priority': 8
-            })
-        
-        # 3. 미국 특허 검색 전략
-        if 'us' in detected_regions or any(
-            keyword in query.lower() for keyword in ['scrubber', 'chiller', 'plasma']
-        ):
-            search_strategies.append({
-                'query': f'{query} site:patents.google.com OR site:uspto.gov',
-                'region': '🇺🇸 미국특허청',
-                'priority': 10
-            })
-            search_strategies.append({
-                'query': f'{query} patent USA',
-                'region': '🇺🇸 미국',
-                'priority': 8
-            })
-        
-        # 4. 유럽 및 국제 특허 검색
-        search_strategies.append({
-            'query': f'{query} site:espacenet.com OR site:epo.org',
-            'region': '🇪🇺 유럽특허청',
-            'priority': 6
-        })
-        
-        # 5. 일반 특허 검색 (폴백)
-        search_strategies.append({
-            'query': f'{query} patent OR 特許 OR 특허',
-            'region': '🌐 글로벌',
-            'priority': 5
-        })
-        
-        # 우선순위 정렬
-        search_strategies.sort(key=lambda x: x['priority'], reverse=True)
-        
-        # 검색 실행
-        results_per_strategy = max(2, max_results // min(len(search_strategies), 3))
-        
-        with DDGS() as ddgs:
-            for strategy in search_strategies[:3]:  # 상위 3개 전략만 실행
-                try:
-                    print(f"[웹 검색] {strategy['region']} - 쿼리: {strategy['query'][:50]}...")
-                    
-                    for idx, result in enumerate(
-                        ddgs.text(strategy['query'], max_results=results_per_strategy)
-                    ):
-                        if idx >= results_per_strategy:
-                            break
-                        
-                        # 중복 제거
-                        url = result.get("href", "")
-                        if any(r['link'] == url for r in all_results):
-                            continue
-                        
-                        all_results.append({
-                            "title": result.get("title", ""),
-                            "snippet": result.get("body", "")[:300],
-                            "link": url,
-                            "region": strategy['region'],
-                            "priority": strategy['priority']
-                        })
-                        
-                        if len(all_results) >= max_results:
-                            break
-                    
-                    if len(all_results) >= max_results:
-                        break
-                        
-                except Exception as strategy_error:
-                    print(f"[웹 검색] {strategy['region']} 전략 실패: {strategy_error}")
-                    continue
-        
-        # 우선순위 및 관련성 기반 정렬
-        all_results.sort(key=lambda x: (
-            x.get('priority', 0),
-            # 특허청 사이트 우선
-            1 if any(domain in x['link'] for domain in [
-                'patents.go.kr', 'kipris.or.kr', 
-                'j-platpat.inpit.go.jp',
-                'patents.google.com', 'uspto.gov',
-                'espacenet.com', 'epo.org'
-            ]) else 0
-        ), reverse=True)
-        
-        # 결과 제한
-        all_results = all_results[:max_results]
-        
-        # 검색 결과 로깅
-        if all_results:
-            print(f"[웹 검색] '{query}' - {len(all_results)}개 결과 발견")
-            for idx, result in enumerate(all_results, 1):
-                print(f"  {idx}. [{result.get('region', '🌐')}] {result['title'][:50]}...")
-        else:
-            print(f"[웹 검색] '{query}' - 검색 결과 없음")
-        
-        return all_results
-        
-    except ImportError:
-        print("[웹 검색] duckduckgo_search 라이브러리가 설치되지 않았습니다.")
-        print("[웹 검색] pip install duckduckgo-search 실행 필요")
-        return []
-    except Exception as e:
-        print(f"[웹 검색] 오류 발생: {type(e).__name__} - {str(e)}")
-        return []
-
-
-def run_query(
-    question: str,
-    top_k: int = 5,
-    include_web: bool = True,
-    web_results_limit: int = 4,
-) -> Dict:
-    index, client = init_clients()
-
-    query_vector = embed_text(client, question)
-    query_response = index.query(
-        namespace=PINECONE_NAMESPACE,
-        vector=query_vector,
-        top_k=top_k,
-        include_metadata=True,
-        include_values=False,
-    )
-
-    matches = []
-    for idx, match in enumerate(query_response.matches or [], start=1):
-        metadata = match.metadata or {}
-        metadata = metadata.copy()
-        metadata.setdefault("score", match.score)
-        metadata["tag"] = f"특허{idx}"
-        matches.append(metadata)
-
-    raw_web_results = web_search(question, web_results_limit) if include_web else []
-    web_results = []
-    for idx, item in enumerate(raw_web_results, start=1):
-        enriched = item.copy()
-        enriched["tag"] = f"웹{idx}"
-        web_results.append(enriched)
-
-    prompt = build_prompt(question, matches, web_results)
-    
-    # OpenAI Chat Completion API 호출 (올바른 방식)
-    chat_response = client.chat.completions.create(
-        model=CHAT_MODEL,
-        messages=[
-            {
-                "role": "system",
-                "content": (
-                    "당신은 GST 특허 데이터에 기반한 전문 분석 어시스턴트입니다. "
-                    "주어진 문맥만을 사용해 질문에 답변하고, 확신이 없을 경우 사실대로 부족한 점을 말씀하세요. "
-                    "항상 한국어로 응답하세요."
-                ),
-            },
-            {
-                "role": "user",
-                "content": prompt,
-            },
-        ],
-        temperature=0.3,  # 일관된 답변을 위해 낮은 temperature
-        max_tokens=1500,
-    )
-
-    answer_text = chat_response.choices[0].message.content.strip()
-    
-    # 토큰 사용량 로깅
-    usage = chat_response.usage
-    print(f"[OpenAI] 모델: {CHAT_MODEL}, 토큰: {usage.total_tokens} "
-          f"(입력: {usage.prompt_tokens}, 출력: {usage.completion_tokens})")
-    
-    return {
-        "answer": answer_text,
-        "matches": matches,
-        "web_results": web_results,
-        "model_used": CHAT_MODEL,
-        "tokens_used": usage.total_tokens,
-    }
+def get_engine() -> RAGEngine:
+    """검색 스레드 풀과 웹 검색 캐시를 가진 RAG 엔진 (rerun 간 재사용)."""
+    return RAGEngine.from_env()
 
 
 def sidebar_controls() -> Tuple[int, bool, int]:
@@ -377,11 +71,47 @@ def sidebar_controls() -> Tuple[int, bool, int]:
     # 모델 정보 표시
     st.sidebar.markdown("---")
     st.sidebar.subheader("🤖 AI 모델 정보")
-    st.sidebar.info(f"**사용 모델:** {CHAT_MODEL}\n**임베딩:** {EMBEDDING_MODEL}")
+    st.sidebar.info(
+        f"**사용 모델:** {CHAT_MODEL}\n**임베딩:** {EMBEDDING_MODEL}\n"
+        f"**벡터 검색:** {'로컬 인덱스' if VECTOR_BACKEND == 'local' else 'Pinecone'}"
+    )
+    embedding_cache = get_embedding_cache()
+    if embedding_cache is not None:
+        cache_stats = embedding_cache.summary()
+        st.sidebar.caption(
+            f"🗂️ 임베딩 캐시 · 적중 {cache_stats['hits']} "
+            f"(메모리 {cache_stats['memory_hits']} / 디스크 {cache_stats['disk_hits']}) · "
+            f"미스 {cache_stats['misses']}"
+        )
+    answer_cache = get_answer_cache()
+    if answer_cache is not None:
+        answer_stats = answer_cache.summary()
+        st.sidebar.caption(
+            f"⚡ 답변 캐시 · 적중 {answer_stats['hits']} · 미스 {answer_stats['misses']} · "
+            f"저장 {answer_stats['size']}건"
+        )
+
+    if st.sidebar.checkbox("⏱️ 단계별 지연 시간 보기", value=False, help="이번 세션 질의의 단계별 p50/p95 (ms)"):
+        traces = st.session_state.get("traces") or []
+        if traces:
+            st.sidebar.dataframe(stage_percentiles(traces), hide_index=True, use_container_width=True)
+            st.sidebar.caption(f"질의 {len(traces)}건 · 로그: {TRACE_LOG_PATH}")
+        else:
+            st.sidebar.caption("아직 기록된 질의가 없습니다.")
 
     st.sidebar.markdown("---")
     st.sidebar.subheader("🔧 데이터 동기화")
-    if st.sidebar.button("Pinecone 업서트 실행", use_container_width=True):
+    if VECTOR_BACKEND == "local":
+        if st.sidebar.button("로컬 인덱스 재생성", use_container_width=True):
+            from scripts.build_local_index import sync_local_index
+
+            with st.spinner("rag_outputs 데이터로 로컬 벡터 인덱스를 만드는 중입니다..."):
+                vectors, docs = sync_local_index()
+            # 캐시에서 빼기 전에 닫아야 이전 엔진의 검색/웹 검색 스레드 풀이 남지 않는다.
+            get_engine().close()
+            get_engine.clear()
+            st.sidebar.success(f"인덱스 생성 완료: {vectors} 벡터 (문서 {docs}건)")
+    elif st.sidebar.button("Pinecone 업서트 실행", use_container_width=True):
         with st.spinner("rag_outputs 데이터를 Pinecone에 업서트하는 중입니다..."):
             upserts, chunks, docs = sync_rag_outputs()
         st.sidebar.success(f"업서트 완료: {upserts} 벡터 (청크 {chunks}개, 문서 {docs}건)")
@@ -402,32 +132,6 @@ def sidebar_controls() -> Tuple[int, bool, int]:
     return top_k, include_web, web_results_limit
 
 
-def sanitize_text(content: str) -> str:
-    lines = content.split("\n")
-    html_lines: List[str] = []
-    in_list = False
-    for raw_line in lines:
-        line = raw_line.strip()
-        if not line:
-            if in_list:
-                html_lines.append("</ul>")
-                in_list = False
-            continue
-        if line.startswith("- "):
-            if not in_list:
-                html_lines.append("<ul>")
-                in_list = True
-            html_lines.append(f"<li>{escape(line[2:])}</li>")
-        else:
-            if in_list:
-                html_lines.append("</ul>")
-                in_list = False
-            html_lines.append(f"<p>{escape(line)}</p>")
-    if in_list:
-        html_lines.append("</ul>")
-    return "\n".join(html_lines) or "<p></p>"
-
-
 def build_reference_block(patent_sources: List[Dict], web_sources: List[Dict]) -> str:
     sections = []
     if patent_sources:
@@ -435,7 +139,7 @@ def build_reference_block(patent_sources: List[Dict], web_sources: List[Dict]) -
         for meta in patent_sources:
             title = escape(meta.get("title") or meta.get("doc_id") or "미상 제목")
             page = escape(str(meta.get("page", "정보 없음")))
-            score = meta.get("score", 0.0)
+            scores = escape(describe_scores(meta))
             tag = escape(meta.get("tag", "특허"))
             url = meta.get("url")
             title_part = (
@@ -443,7 +147,7 @@ def build_reference_block(patent_sources: List[Dict], web_sources: List[Dict]) -
                 if url
                 else f"<strong>{title}</strong>"
             )
-            items.append(f"<li>[{tag}] {title_part} · 페이지 {page} · 점수 {score:.3f}</li>")
+            items.append(f"<li>[{tag}] {title_part} · 페이지 {page} · {scores}</li>")
         sections.append(
             "<div class='reference-group'><div class='reference-title'>📘 특허 근거</div>"
             f"<ul>{''.join(items)}</ul></div>"
@@ -483,6 +187,7 @@ def build_patent_url(meta: Dict) -> str | None:
 
 
 def source_cleanup(patent_sources: List[Dict]) -> List[Dict]:
+    """대화 기록에 남길 출처 참조만 추린다. 청크 본문은 세션 메모리를 키우므로 보관하지 않는다."""
     cleaned = []
     for meta in patent_sources or []:
         url = build_patent_url(meta)
@@ -492,8 +197,10 @@ def source_cleanup(patent_sources: List[Dict]) -> List[Dict]:
                 "doc_id": meta.get("doc_id"),
                 "page": meta.get("page"),
                 "score": meta.get("score"),
+                "rrf_score": meta.get("rrf_score"),
+                "rerank_score": meta.get("rerank_score"),
                 "tag": meta.get("tag"),
-                "content": meta.get("content") or meta.get("text"),
+                "chunk_id": meta.get("chunk_id"),
                 "url": url,
             }
         )
@@ -527,6 +234,50 @@ def ensure_sources_section(answer: str, patent_sources: List[Dict], web_sources:
     return "\n".join(lines)
 
 
+def assistant_label(message: Dict) -> str:
+    """캐시에서 재사용한 답변은 말풍선 제목에 표시한다."""
+    if message.get("cached"):
+        similarity = message.get("cache_similarity")
+        suffix = f" (유사도 {similarity:.2f})" if similarity is not None else ""
+        return f"GST 특허 AI · ⚡ 캐시된 답변{suffix}"
+    return "GST 특허 AI"
+
+
+def message_html(message: Dict) -> str:
+    """메시지의 말풍선 HTML. 처음 한 번만 만들고 메시지에 저장해 rerun마다 다시 변환하지 않는다."""
+    html = message.get("html")
+    if html is None:
+        if message["role"] == "user":
+            html = build_message_html("user", "사용자", sanitize_text(message["content"]))
+        else:
+            reference_html = build_reference_block(message.get("sources") or [], message.get("web_sources") or [])
+            html = build_message_html(
+                "assistant", assistant_label(message), sanitize_text(message["content"]), reference_html
+            )
+        message["html"] = html
+    return html
+
+
+def append_message(message: Dict) -> None:
+    """대화 기록에 추가하고 CHAT_HISTORY_LIMIT를 넘는 오래된 메시지는 버린다."""
+    conversation = st.session_state.conversation
+    message_html(message)
+    conversation.append(message)
+    if len(conversation) > CHAT_HISTORY_LIMIT:
+        del conversation[: len(conversation) - CHAT_HISTORY_LIMIT]
+
+
+def render_history(container) -> None:
+    """최근 CHAT_VISIBLE_MESSAGES개만 항상 그리고, 그 이전 대화는 펼쳤을 때만 한 번에 그린다."""
+    conversation = st.session_state.conversation
+    split = max(0, len(conversation) - CHAT_VISIBLE_MESSAGES)
+    older, recent = conversation[:split], conversation[split:]
+    if older and container.toggle(f"이전 대화 {len(older)}개 보기", key="show_older_messages"):
+        container.markdown("".join(message_html(message) for message in older), unsafe_allow_html=True)
+    for message in recent:
+        container.container().markdown(message_html(message), unsafe_allow_html=True)
+
+
 def build_message_html(role_class: str, label: str, content_html: str, reference_html: str = "") -> str:
     return (
         f"<div class='chat-message {role_class}'>"
@@ -537,18 +288,39 @@ def build_message_html(role_class: str, label: str, content_html: str, reference
     )
 
 
-def typewriter_render(container, raw_text: str, references_html: str):
-    placeholder = container.empty()
-    tokens = re.split(r"(\s+)", raw_text)
-    buffer = ""
-    for token in tokens:
-        buffer += token
-        content_html = sanitize_text(buffer)
-        html = build_message_html("assistant", "GST 특허 AI", content_html)
-        placeholder.markdown(html, unsafe_allow_html=True)
-        time.sleep(0.04)
-    final_html = build_message_html("assistant", "GST 특허 AI", sanitize_text(raw_text), references_html)
-    placeholder.markdown(final_html, unsafe_allow_html=True)
+class StreamingRender:
+    """스트리밍 중인 답변을 하나의 placeholder에 갱신하고, 완료 후 출처 블록과 함께 최종 렌더링한다.
+
+    완료된 줄의 HTML은 IncrementalAnswerRenderer가 캐시하므로 토큰마다 마지막 줄만 다시 변환하고,
+    placeholder 갱신은 STREAM_RENDER_INTERVAL 간격으로 묶어 웹소켓 전송량을 줄인다.
+    """
+
+    def __init__(self, container, interval: float = STREAM_RENDER_INTERVAL):
+        self.placeholder = container.empty()
+        self.renderer = IncrementalAnswerRenderer()
+        self.interval = interval
+        self._last_flush = 0.0
+        self.render_seconds = 0.0
+        self.flushes = 0
+
+    def __call__(self, delta: str) -> None:
+        started = time.perf_counter()
+        content_html = self.renderer.feed(delta)
+        if started - self._last_flush >= self.interval:
+            self._last_flush = started
+            html = build_message_html("assistant", "GST 특허 AI", content_html)
+            self.placeholder.markdown(html, unsafe_allow_html=True)
+            self.flushes += 1
+        self.render_seconds += time.perf_counter() - started
+
+    def finish(self, raw_text: str, references_html: str, label: str = "GST 특허 AI") -> str:
+        """최종 HTML을 렌더링하고 돌려준다. 호출자는 이를 메시지에 저장해 rerun 때 재사용한다."""
+        started = time.perf_counter()
+        final_html = build_message_html("assistant", label, sanitize_text(raw_text), references_html)
+        self.placeholder.markdown(final_html, unsafe_allow_html=True)
+        self.flushes += 1
+        self.render_seconds += time.perf_counter() - started
+        return final_html
 
 
 CUSTOM_CSS = """
@@ -691,21 +463,7 @@ def main():
     chat_container = st.container()
     chat_container.markdown("<div class='chat-wrapper'>", unsafe_allow_html=True)
 
-    for message in st.session_state.conversation:
-        role_class = "user" if message["role"] == "user" else "assistant"
-        label = "사용자" if message["role"] == "user" else "GST 특허 AI"
-        message_html = sanitize_text(message["content"])
-        reference_html = ""
-        if message["role"] == "assistant":
-            reference_html = build_reference_block(
-                message.get("sources") or [],
-                message.get("web_sources") or [],
-            )
-        msg_container = chat_container.container()
-        msg_container.markdown(
-            build_message_html(role_class, label, message_html, reference_html),
-            unsafe_allow_html=True,
-        )
+    render_history(chat_container)
 
     pending_container = chat_container.container()
     closing_container = chat_container.container()
@@ -713,32 +471,40 @@ def main():
 
     prompt = st.chat_input("특허 관련 질문을 입력하세요.")
     if prompt:
-        st.session_state.conversation.append({"role": "user", "content": prompt})
+        append_message({"role": "user", "content": prompt})
         with st.spinner("GST 특허 RAG 챗봇 관련 질문의 정보와 특허를 분석하고 있습니다..."):
+            trace = Trace("chat", question=prompt)
             try:
-                result = run_query(
+                renderer = StreamingRender(pending_container)
+                result = get_engine().run_query(
                     prompt,
                     top_k=top_k,
                     include_web=include_web,
                     web_results_limit=web_results_limit,
+                    on_token=renderer,
+                    trace=trace,
                 )
                 sources = result["matches"]
                 web_sources = result["web_results"]
                 answer = ensure_sources_section(result["answer"], sources, web_sources)
                 clean_sources = source_cleanup(sources)
                 references_html = build_reference_block(clean_sources, web_sources)
-                typewriter_render(pending_container, answer, references_html)
-                st.session_state.conversation.append(
-                    {
-                        "role": "assistant",
-                        "content": answer,
-                        "sources": clean_sources,
-                        "web_sources": web_sources,
-                    }
+                assistant_message = {
+                    "role": "assistant",
+                    "content": answer,
+                    "sources": clean_sources,
+                    "web_sources": web_sources,
+                    "cached": result.get("cached", False),
+                    "cache_similarity": result.get("cache_similarity"),
+                }
+                assistant_message["html"] = renderer.finish(
+                    answer, references_html, assistant_label(assistant_message)
                 )
+                trace.add_span("render", renderer.render_seconds, flushes=renderer.flushes)
+                append_message(assistant_message)
             except Exception as exc:
                 st.error(f"질의 처리 중 오류가 발생했습니다: {exc}")
-                st.session_state.conversation.append(
+                append_message(
                     {
                         "role": "assistant",
                         "content": "죄송합니다. 현재 질의를 처리하는 중 오류가 발생했습니다.",
@@ -746,6 +512,10 @@ def main():
                         "web_sources": [],
                     }
                 )
+            finally:
+                traces = st.session_state.setdefault("traces", [])
+                traces.append(trace.finish())
+                del traces[:-CHAT_HISTORY_LIMIT]
         if hasattr(st, "rerun"):
             st.rerun()
         elif hasattr(st, "experimental_rerun"):